@@ -1,259 +1,628 @@
 import os
 import json
 import re
-from typing import Any, Dict, List, Optional, Tuple
-
+import asyncio
+import copy
+import threading
+from functools import lru_cache, partial
+from hashlib import blake2b
+from typing import TYPE_CHECKING, Any, Callable, Coroutine, Dict, Iterator, List, Literal, Optional, Tuple, TypedDict, TypeVar, cast
+
+import orjson
 from dotenv import load_dotenv
-from langchain_groq import ChatGroq
 from json_repair import repair_json
 
+import analyzer_cache
+import semantic_cache
+from code_norm import canonical
+
+if TYPE_CHECKING:
+	from langchain_groq import ChatGroq
+
 load_dotenv()
 
+T = TypeVar("T")
+
+# Bump whenever a prompt builder changes so cached responses from the old prompt are ignored
+PROMPT_VERSION = 3
+
+# Generation defaults shared by the single-analysis wrappers and the concurrent/batch
+# paths; they are part of the cache key, so every path must use the same values
+DEFAULT_MODEL = "llama-3.1-8b-instant"
+TRACE_TEMPERATURE = 0.2
+# Trace output grows with the executed steps, not the line count; short loops need thousands of tokens
+TRACE_MAX_TOKENS = 6000
+DEBUGGER_TEMPERATURE = 0.1
+DEBUGGER_MAX_TOKENS = 3000
+COMPLEXITY_TEMPERATURE = 0.1
+COMPLEXITY_MAX_TOKENS = 3500
+
+_FENCE_PREFIX = "```"
+_CODE_FENCE_RE = re.compile(r"^```[a-zA-Z0-9]*\n|\n```$")
+_TRAILING_COMMA_SCAN_RE = re.compile(r'[,\]}"\\]')
+_JSON_STRUCTURE_RE = re.compile(r'[{}"\\]')
+
+
+_api_key: Optional[str] = None
+
 
 def get_groq_api_key() -> Optional[str]:
+	global _api_key
+	# Only a found key is memoized, so adding GROQ_API_KEY later still takes effect
+	if _api_key:
+		return _api_key
 	key = os.getenv("GROQ_API_KEY")
-	if key:
-		return key
-	try:
-		from streamlit.runtime.secrets import AttrDict  # type: ignore
-		import streamlit as st  # lazy import
-		secrets_obj = getattr(st, "secrets", None)
-		if secrets_obj is not None:
-			return secrets_obj.get("GROQ_API_KEY", None)  # type: ignore[attr-defined]
-	except Exception:
-		return None
-	return None
-
-
-def build_prompts(language: str, code_text: str) -> Tuple[str, str]:
-	system_prompt = (
-		"You are Code Visualizer AI, an expert at analyzing code execution step by step. "
-		"Your task is to create a detailed, accurate visualization of how code executes. "
-		"Analyze every line, every operation, every variable change, and every control flow decision. "
-		"Be extremely precise about variable values, memory states, and execution flow. "
-		"For the summary, provide a comprehensive analysis that includes: "
-		"1) Clear explanation of the code's purpose and main functionality, "
-		"2) Detailed breakdown of each function and its role, "
-		"3) Algorithm logic and approach used, "
-		"4) Data flow and how variables are used throughout, "
-		"5) Expected outputs and behavior, "
-		"6) Key programming concepts demonstrated, "
-		"7) Time/space complexity analysis if applicable, "
-		"8) Educational insights about the code structure. "
-		"Return ONLY valid JSON that can be parsed with Python json.loads(). "
-		"No markdown, no explanations outside the JSON structure."
+	if not key:
+		try:
+			import streamlit as st  # lazy import
+			secrets_obj = getattr(st, "secrets", None)
+			if secrets_obj is not None:
+				key = secrets_obj.get("GROQ_API_KEY", None)  # type: ignore[attr-defined]
+		except Exception:
+			return None
+	_api_key = key or None
+	return _api_key
+
+
+def reset_api_key_cache() -> None:
+	global _api_key
+	_api_key = None
+	# Clients built with the old key must not be reused
+	_get_llm.cache_clear()
+
+
+def _cache_key(
+	kind: str,
+	code_text: str,
+	language: str,
+	model_name: str,
+	temperature: float,
+	max_tokens: int,
+	prompt_level: str = "standard",
+) -> str:
+	# Formatting-only edits (comments, spacing) map to the same key
+	raw = (
+		f"{kind}|{model_name}|{temperature}|{max_tokens}|{PROMPT_VERSION}|{prompt_level}|{language}|"
+		f"{canonical(code_text, language)}"
 	)
-	user_prompt = f"""
-Language: {language}
-Code:
-<CODE>
-{code_text}
-</CODE>
-
-Create a detailed step-by-step execution analysis. Return ONLY valid JSON with this exact structure:
-{{
-  "language": "{language}",
-  "summary": "Comprehensive analysis including: 1) Code purpose and main functionality, 2) Function definitions and their roles, 3) Algorithm logic and approach, 4) Data flow and variable usage, 5) Expected outputs and behavior, 6) Key concepts demonstrated, 7) Complexity analysis if applicable",
-  "steps": [
-    {{
-      "step": 1,
-      "line": 1,
-      "operation": "Detailed operation name (e.g., 'Variable Declaration', 'Function Call', 'Conditional Check', 'Loop Iteration')",
-      "explanation": "Detailed explanation of what happens at this step, including the reasoning and context",
-      "variables": {{ 
-        "varName": "current_value", 
-        "varName_type": "data_type",
-        "varName_address": "memory_location_if_relevant"
-      }},
-      "call_stack": ["function_name", "nested_function"],
-      "outputs": "Any console output, return values, or side effects",
-      "memory_state": {{ 
-        "heap": {{ "object_id": "object_details" }},
-        "stack": ["local_variables"]
-      }},
-      "control_flow": "branch_taken or loop_condition or exception_handling",
-      "data_structures": {{
-        "list_name": {{ "elements": [1, 2, 3], "index": 0, "length": 3 }},
-        "dict_name": {{ "keys": ["key1"], "values": ["value1"], "current_key": "key1" }}
-      }},
-      "execution_context": "What part of the program is currently executing",
-      "next_action": "What will happen in the next step"
-    }}
-  ]
-}}
-
-CRITICAL RULES:
-1. Track EVERY variable assignment, function call, conditional check, and loop iteration
-2. Show the EXACT values of variables at each step
-3. Include data type information for variables
-4. Track function calls and return values accurately
-5. Show control flow decisions (if/else branches, loop conditions)
-6. For data structures (lists, dicts, objects), show their current state
-7. Include memory management details when relevant
-8. Be precise about line numbers - each executable line should have a step
-9. Show the execution context (which function, loop iteration, etc.)
-10. Use only double quotes, no trailing commas, valid JSON syntax
-11. Make explanations educational and detailed for learning purposes
-
-SUMMARY REQUIREMENTS:
-- Write a comprehensive, educational summary (3-5 paragraphs)
-- Explain the code's purpose and main functionality clearly
-- Break down each function and explain its specific role
-- Describe the algorithm logic and approach used
-- Explain data flow and variable usage patterns
-- Detail expected outputs and behavior
-- Highlight key programming concepts demonstrated
-- Include complexity analysis (time/space) where applicable
-- Provide educational insights about code structure and design patterns
-- Make it suitable for learning and understanding the code thoroughly
-"""
-	return system_prompt, user_prompt
+	# 128 bits is plenty for a cache key and keeps keys short on disk
+	return blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+
+PromptLevel = Literal["terse", "standard", "verbose"]
+PROMPT_LEVELS: Tuple[str, ...] = ("terse", "standard", "verbose")
+# Summary length and per-step detail requested at each verbosity level
+_PROMPT_LEVEL_DETAIL: Dict[str, Tuple[str, str]] = {
+	"terse": (
+		"1 short paragraph: purpose and expected output",
+		"one-sentence explanations; memory_state and data_structures only when they change",
+	),
+	"standard": (
+		"3-5 paragraphs separated by blank lines: purpose, role of each function, algorithm, data flow, "
+		"expected output, key concepts, time/space complexity",
+		"exact values and types at every step",
+	),
+	"verbose": (
+		"5-7 paragraphs separated by blank lines: purpose, role of each function, algorithm, data flow, "
+		"expected output, key concepts, edge cases, time/space complexity",
+		"exact values and types at every step; explanations cover why each value changes",
+	),
+}
+
+
+def _trace_system_prompt(summary_detail: str, step_detail: str) -> str:
+	return f"""You are Code Visualizer AI. Trace code execution step by step with exact variable values, call stack, control flow and data structure states. Return ONLY valid JSON matching the schema below: no markdown, no text outside the JSON.
+
+JSON schema (one step per executed line, in execution order):
+{{"language":"<the given Language>","summary":"{summary_detail}","steps":[{{"step":1,"line":1,"operation":"e.g. Variable Declaration, Function Call, Conditional Check, Loop Iteration","explanation":"what happens and why","variables":{{"name":"value","name_type":"type"}},"call_stack":["function_name"],"outputs":"console output, return value or side effect","memory_state":{{"heap":{{"object_id":"details"}},"stack":["local_variables"]}},"control_flow":"branch taken or loop condition","data_structures":{{"list_name":{{"elements":[1,2],"index":0,"length":2}},"dict_name":{{"keys":["k"],"values":["v"],"current_key":"k"}}}},"execution_context":"current function or iteration","next_action":"what happens next"}}]}}
+
+Rules: {step_detail}; a step for every iteration and call; precise line numbers; double quotes only, no trailing commas."""
+
+
+# Everything except the snippet lives in the system prompt, built once per level, so each
+# request starts with a byte-identical prefix that provider-side prompt caching can reuse
+_TRACE_SYSTEM_PROMPTS: Dict[str, str] = {
+	level: _trace_system_prompt(*detail) for level, detail in _PROMPT_LEVEL_DETAIL.items()
+}
+
+
+def _code_user_prompt(language: str, code_text: str) -> str:
+	return f"Language: {language}\nCode:\n<CODE>\n{code_text}\n</CODE>"
+
+
+def build_prompts(language: str, code_text: str, prompt_level: PromptLevel = "standard") -> Tuple[str, str]:
+	return _TRACE_SYSTEM_PROMPTS[prompt_level], _code_user_prompt(language, code_text)
 
 
 def _strip_code_fences(text: str) -> str:
-	if text.strip().startswith("```"):
+	stripped = text.strip()
+	if stripped.startswith(_FENCE_PREFIX):
 		# remove first and last triple backticks blocks
-		return re.sub(r"^```[a-zA-Z0-9]*\n|\n```$", "", text.strip())
+		return _CODE_FENCE_RE.sub("", stripped)
 	return text
 
 
 def _remove_trailing_commas(json_like: str) -> str:
-	# Remove trailing commas before } or ]
-	return re.sub(r",\s*(?=[}\]])", "", json_like)
+	# Remove trailing commas before } or ]. Quote state is tracked like in
+	# _extract_json_block, so code quoted inside a string value ("[1, 2, ]") is kept.
+	parts: List[str] = []
+	kept_from = 0
+	comma = -1
+	in_string = False
+	escaped_at = -1
+	for match in _TRAILING_COMMA_SCAN_RE.finditer(json_like):
+		i = match.start()
+		if i == escaped_at:
+			continue
+		c = json_like[i]
+		if in_string:
+			if c == "\\":
+				escaped_at = i + 1
+			elif c == '"':
+				in_string = False
+		elif c == '"':
+			in_string = True
+			comma = -1
+		elif c == ",":
+			comma = i
+		elif c in "]}":
+			if comma != -1 and not json_like[comma + 1 : i].strip():
+				parts.append(json_like[kept_from:comma])
+				kept_from = comma + 1
+			comma = -1
+	parts.append(json_like[kept_from:])
+	return "".join(parts)
 
 
 def _extract_json_block(text: str) -> Optional[str]:
-	start = text.find("{")
-	end = text.rfind("}")
-	if start != -1 and end != -1 and end > start:
-		return text[start : end + 1]
-	return None
+	# First balanced top-level object. Quote state is tracked so braces inside string
+	# values (or in prose after the object) don't decide where it ends; the regex
+	# skips straight to structural characters instead of visiting every one.
+	depth = 0
+	start = -1
+	in_string = False
+	escaped_at = -1
+	for match in _JSON_STRUCTURE_RE.finditer(text):
+		i = match.start()
+		if i == escaped_at:
+			continue
+		c = text[i]
+		if in_string:
+			if c == "\\":
+				escaped_at = i + 1
+			elif c == '"':
+				in_string = False
+		elif c == '"':
+			# Quotes in prose around the object are not JSON strings
+			in_string = depth > 0
+		elif c == "{":
+			if depth == 0:
+				start = i
+			depth += 1
+		elif c == "}" and depth > 0:
+			depth -= 1
+			if depth == 0:
+				return text[start : i + 1]
+	# Truncated response: hand the unterminated object to the repair pass
+	return text[start:] if start != -1 else None
+
+
+@lru_cache(maxsize=32)
+def _repair_json_cached(candidate: str) -> str:
+	# Streamlit reruns often hand the same malformed response back for parsing
+	return repair_json(candidate)
 
 
 def safe_json_loads(content: str) -> Dict[str, Any]:
 	# First try direct parse
 	try:
-		return json.loads(content)
+		return orjson.loads(content)
 	except Exception:
 		pass
-	# Strip code fences
+	# Strip code fences and trailing commas, then retry before the expensive repair.
+	# The object is extracted first so quotes in surrounding prose don't skew the comma scan.
 	clean = _strip_code_fences(content)
-	candidate = _extract_json_block(clean) or clean
+	candidate = _remove_trailing_commas(_extract_json_block(clean) or clean)
+	try:
+		return orjson.loads(candidate)
+	except Exception:
+		pass
 	# Use json_repair to fix broken JSON
-	repaired = repair_json(candidate)
+	repaired = _repair_json_cached(candidate)
 	return json.loads(repaired)
 
 
-def analyze_code_with_llm(
-	code_text: str,
-	language: str,
-	model_name: str = "llama-3.1-8b-instant",
-	temperature: float = 0.2,
-	max_tokens: int = 6000,
-) -> Dict[str, Any]:
+def _require_api_key() -> str:
 	api_key = get_groq_api_key()
 	if not api_key:
 		raise RuntimeError("Missing GROQ_API_KEY. Set it in .env or Streamlit secrets to analyze code.")
+	return api_key
+
 
-	llm = ChatGroq(
-		api_key=api_key,
+@lru_cache(maxsize=8)
+def _get_llm(model_name: str, temperature: float, max_tokens: int) -> "ChatGroq":
+	# One client (and HTTP connection pool) per generation config, reused across analyses.
+	# Imported here: langchain_groq takes ~0.5 s to load and the UI can render without it.
+	from langchain_groq import ChatGroq
+
+	return ChatGroq(
+		api_key=_require_api_key(),
 		model=model_name,
 		temperature=temperature,
 		max_tokens=max_tokens,
 	)
 
-	system_prompt, user_prompt = build_prompts(language, code_text)
-	messages = [("system", system_prompt), ("user", user_prompt)]
-	response = llm.invoke(messages)
+
+def _build_messages(system_prompt: str, user_prompt: str) -> List[Tuple[str, str]]:
+	return [("system", system_prompt), ("user", user_prompt)]
+
+
+def _finish_reason(message: Any) -> Optional[str]:
+	metadata = getattr(message, "response_metadata", None) or {}
+	return metadata.get("finish_reason")
+
+
+# Both return (content, truncated); truncated means the model stopped at max_tokens
+def _invoke(
+	system_prompt: str, user_prompt: str, model_name: str, temperature: float, max_tokens: int
+) -> Tuple[str, bool]:
+	llm = _get_llm(model_name, temperature, max_tokens)
+	response = llm.invoke(_build_messages(system_prompt, user_prompt))
+	content = response.content if hasattr(response, "content") else str(response)
+	return content, _finish_reason(response) == "length"
+
+
+async def _ainvoke(
+	system_prompt: str, user_prompt: str, model_name: str, temperature: float, max_tokens: int
+) -> Tuple[str, bool]:
+	llm = _get_llm(model_name, temperature, max_tokens)
+	response = await llm.ainvoke(_build_messages(system_prompt, user_prompt))
 	content = response.content if hasattr(response, "content") else str(response)
+	return content, _finish_reason(response) == "length"
 
-	result = safe_json_loads(content)
 
+def _lookup_cached(
+	cache_key: str, code_text: str, language: str, use_semantic_cache: bool, prompt_level: str
+) -> Optional[Dict[str, Any]]:
+	cached = analyzer_cache.get(cache_key)
+	if cached is None and use_semantic_cache:
+		cached = semantic_cache.lookup(code_text, language, prompt_level)
+	return cached
+
+
+async def _alookup_cached(
+	cache_key: str, code_text: str, language: str, use_semantic_cache: bool, prompt_level: str
+) -> Optional[Dict[str, Any]]:
+	cached = analyzer_cache.get(cache_key)
+	if cached is None and use_semantic_cache:
+		# Concurrent coroutines share one batched embedding call
+		cached = await semantic_cache.alookup(code_text, language, prompt_level)
+	return cached
+
+
+BUILTIN_ANALYSES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "builtin_analyses.json")
+
+
+@lru_cache(maxsize=1)
+def _load_builtin_analyses() -> Dict[Tuple[str, str], Dict[str, Any]]:
+	# Keyed at load time so the shipped file stays valid when canonical() changes
+	try:
+		with open(BUILTIN_ANALYSES_PATH, "rb") as f:
+			entries = orjson.loads(f.read())
+	except Exception:
+		return {}
+	return {(entry["language"], canonical(entry["code"], entry["language"])): entry["analysis"] for entry in entries}
+
+
+def _builtin_analysis(kind: str, code_text: str, language: str, prompt_level: str) -> Optional[Dict[str, Any]]:
+	# Shipped traces of common examples, and input with nothing to execute, skip the LLM
+	if kind != "code":
+		return None
+	canonical_code = canonical(code_text, language)
+	if not canonical_code.strip():
+		return {"language": language, "summary": "The code contains no statements to execute.", "steps": []}
+	# The shipped traces are written at standard detail; other levels go to the model
+	if prompt_level != "standard":
+		return None
+	analysis = _load_builtin_analyses().get((language, canonical_code))
+	return copy.deepcopy(analysis) if analysis is not None else None
+
+
+def _store_result(
+	cache_key: str,
+	code_text: str,
+	language: str,
+	result: Dict[str, Any],
+	use_semantic_cache: bool,
+	prompt_level: str,
+	truncated: bool,
+) -> Dict[str, Any]:
+	if truncated:
+		# repair_json turns a cut-off response into a partial result: return it flagged,
+		# but keep it out of the caches so the next request asks the model again
+		result["truncated"] = True
+		return result
+	analyzer_cache.put(cache_key, result)
+	if use_semantic_cache:
+		semantic_cache.add(code_text, language, result, prompt_level)
+	return result
+
+
+def _run_analysis(
+	kind: str,
+	code_text: str,
+	language: str,
+	model_name: str,
+	temperature: float,
+	max_tokens: int,
+	build: Callable[[str, str], Tuple[str, str]],
+	normalize: Callable[[Dict[str, Any], str], Dict[str, Any]],
+	use_semantic_cache: bool = False,
+	prompt_level: str = "standard",
+	refresh: bool = False,
+) -> Dict[str, Any]:
+	cache_key = _cache_key(kind, code_text, language, model_name, temperature, max_tokens, prompt_level)
+	# refresh skips every lookup; the new result still replaces the cached one
+	cached = None if refresh else _lookup_cached(cache_key, code_text, language, use_semantic_cache, prompt_level)
+	if cached is None and not refresh:
+		cached = _builtin_analysis(kind, code_text, language, prompt_level)
+	if cached is not None:
+		return cached
+
+	system_prompt, user_prompt = build(language, code_text)
+	content, truncated = _invoke(system_prompt, user_prompt, model_name, temperature, max_tokens)
+	result = normalize(safe_json_loads(content), language)
+	return _store_result(cache_key, code_text, language, result, use_semantic_cache, prompt_level, truncated)
+
+
+async def _arun_analysis(
+	kind: str,
+	code_text: str,
+	language: str,
+	model_name: str,
+	temperature: float,
+	max_tokens: int,
+	build: Callable[[str, str], Tuple[str, str]],
+	normalize: Callable[[Dict[str, Any], str], Dict[str, Any]],
+	use_semantic_cache: bool = False,
+	prompt_level: str = "standard",
+	refresh: bool = False,
+) -> Dict[str, Any]:
+	cache_key = _cache_key(kind, code_text, language, model_name, temperature, max_tokens, prompt_level)
+	cached = None if refresh else await _alookup_cached(cache_key, code_text, language, use_semantic_cache, prompt_level)
+	if cached is None and not refresh:
+		cached = _builtin_analysis(kind, code_text, language, prompt_level)
+	if cached is not None:
+		return cached
+
+	system_prompt, user_prompt = build(language, code_text)
+	content, truncated = await _ainvoke(system_prompt, user_prompt, model_name, temperature, max_tokens)
+	result = normalize(safe_json_loads(content), language)
+	return _store_result(cache_key, code_text, language, result, use_semantic_cache, prompt_level, truncated)
+
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def run_async(coro: Coroutine[Any, Any, T]) -> T:
+	global _loop
+	# The cached ChatGroq clients keep async HTTP connections bound to the loop that
+	# opened them, so coroutines run on one long-lived loop instead of asyncio.run()
+	with _loop_lock:
+		if _loop is None:
+			_loop = asyncio.new_event_loop()
+			threading.Thread(target=_loop.run_forever, name="analyzer-loop", daemon=True).start()
+	return asyncio.run_coroutine_threadsafe(coro, _loop).result()
+
+
+class Step(TypedDict):
+	step: int
+	line: Optional[int]
+	operation: str
+	explanation: str
+	variables: Dict[str, Any]
+	call_stack: List[str]
+	outputs: str
+	memory_state: Dict[str, Any]
+	control_flow: str
+	data_structures: Dict[str, Any]
+	execution_context: str
+	next_action: str
+
+
+_STEP_DEFAULTS: Dict[str, Any] = {
+	"line": None,
+	"operation": "",
+	"explanation": "",
+	"outputs": "",
+	"control_flow": "",
+	"execution_context": "",
+	"next_action": "",
+}
+# Container fields get a fresh object per step so callers can mutate them safely
+_STEP_CONTAINER_DEFAULTS: Tuple[Tuple[str, Callable[[], Any]], ...] = (
+	("variables", dict),
+	("call_stack", list),
+	("memory_state", dict),
+	("data_structures", dict),
+)
+
+
+def _normalize_step(step: Dict[str, Any], index: int) -> Step:
+	# One merge per step instead of a .get() per field
+	normalized = {**_STEP_DEFAULTS, **step}
+	if "step" not in normalized:
+		normalized["step"] = index
+	for key, factory in _STEP_CONTAINER_DEFAULTS:
+		if key not in normalized:
+			normalized[key] = factory()
+	return cast(Step, normalized)
+
+
+def _normalize_analysis(result: Dict[str, Any], language: str) -> Dict[str, Any]:
 	result.setdefault("language", language)
 	result.setdefault("summary", "")
 	steps = result.get("steps", []) or []
-	normalized_steps: List[Dict[str, Any]] = []
-	for i, step in enumerate(steps, start=1):
-		normalized_steps.append(
-			{
-				"step": step.get("step", i),
-				"line": step.get("line", None),
-				"operation": step.get("operation", ""),
-				"explanation": step.get("explanation", ""),
-				"variables": step.get("variables", {}),
-				"call_stack": step.get("call_stack", []),
-				"outputs": step.get("outputs", ""),
-				"memory_state": step.get("memory_state", {}),
-				"control_flow": step.get("control_flow", ""),
-				"data_structures": step.get("data_structures", {}),
-				"execution_context": step.get("execution_context", ""),
-				"next_action": step.get("next_action", ""),
-			}
-		)
-	result["steps"] = normalized_steps
+	result["steps"] = [_normalize_step(step, i) for i, step in enumerate(steps, start=1)]
 	return result
 
 
-def _build_debugger_prompts(language: str, code_text: str) -> Tuple[str, str]:
-	system_prompt = (
-		"You are an expert debugging assistant. Identify syntax, runtime, and logic errors in code. "
-		"Explain the root cause in plain language and propose safe, actionable fixes. "
-		"Provide a fully corrected version of the code that applies those fixes. "
-		"Return ONLY strict JSON matching the required schema."
+# Extracts complete objects of the top-level "steps" array from streamed chunks.
+# Each chunk is scanned once; quote and brace state carries over between chunks.
+class _StepStreamParser:
+	def __init__(self) -> None:
+		self._depth = 0
+		self._in_string = False
+		self._escaped = False
+		self._key_chars: List[str] = []
+		self._last_key = ""
+		self._in_steps = False
+		self._step_parts: Optional[List[str]] = None
+
+	def feed(self, chunk: str) -> List[str]:
+		completed: List[str] = []
+		segment_start = 0
+		for i, c in enumerate(chunk):
+			if self._in_string:
+				if self._escaped:
+					self._escaped = False
+				elif c == "\\":
+					self._escaped = True
+				elif c == '"':
+					self._in_string = False
+					if self._depth == 1:
+						self._last_key = "".join(self._key_chars)
+				elif self._depth == 1:
+					self._key_chars.append(c)
+				continue
+			if c == '"':
+				self._in_string = True
+				self._key_chars = []
+			elif c == "{" or c == "[":
+				self._depth += 1
+				if c == "[" and self._depth == 2 and self._last_key == "steps":
+					self._in_steps = True
+				elif c == "{" and self._in_steps and self._depth == 3:
+					self._step_parts = []
+					segment_start = i
+			elif c == "}" or c == "]":
+				if c == "}" and self._in_steps and self._depth == 3 and self._step_parts is not None:
+					self._step_parts.append(chunk[segment_start : i + 1])
+					completed.append("".join(self._step_parts))
+					self._step_parts = None
+				elif c == "]" and self._in_steps and self._depth == 2:
+					self._in_steps = False
+				self._depth -= 1
+		if self._step_parts is not None:
+			self._step_parts.append(chunk[segment_start:])
+		return completed
+
+
+def analyze_code_with_llm(
+	code_text: str,
+	language: str,
+	model_name: str = DEFAULT_MODEL,
+	temperature: float = TRACE_TEMPERATURE,
+	max_tokens: int = TRACE_MAX_TOKENS,
+	prompt_level: PromptLevel = "standard",
+	refresh: bool = False,
+	use_semantic_cache: bool = False,
+) -> Dict[str, Any]:
+	# The semantic cache is opt-in: with canonical() in the exact key, its only extra
+	# hits are snippets whose names or literals differ, i.e. a trace of other values
+	return _run_analysis(
+		"code",
+		code_text,
+		language,
+		model_name,
+		temperature,
+		max_tokens,
+		partial(build_prompts, prompt_level=prompt_level),
+		_normalize_analysis,
+		use_semantic_cache=use_semantic_cache,
+		prompt_level=prompt_level,
+		refresh=refresh,
 	)
-	user_prompt = f"""
-Language: {language}
-Code:
-<CODE>
-{code_text}
-</CODE>
+
+
+def stream_code_analysis(
+	code_text: str,
+	language: str,
+	model_name: str = DEFAULT_MODEL,
+	temperature: float = TRACE_TEMPERATURE,
+	max_tokens: int = TRACE_MAX_TOKENS,
+	prompt_level: PromptLevel = "standard",
+	refresh: bool = False,
+	use_semantic_cache: bool = False,
+) -> Iterator[Dict[str, Any]]:
+	# Yields partial analyses (steps parsed so far) while the response streams in.
+	# The last item is the final analysis, parsed and cached like analyze_code_with_llm.
+	cache_key = _cache_key("code", code_text, language, model_name, temperature, max_tokens, prompt_level)
+	cached = None if refresh else _lookup_cached(cache_key, code_text, language, use_semantic_cache, prompt_level)
+	if cached is None and not refresh:
+		cached = _builtin_analysis("code", code_text, language, prompt_level)
+	if cached is not None:
+		yield cached
+		return
+
+	llm = _get_llm(model_name, temperature, max_tokens)
+	system_prompt, user_prompt = build_prompts(language, code_text, prompt_level)
+	parser = _StepStreamParser()
+	parts: List[str] = []
+	steps: List[Step] = []
+	finish_reason: Optional[str] = None
+	for chunk in llm.stream(_build_messages(system_prompt, user_prompt)):
+		# Only the last chunk carries the finish reason
+		finish_reason = _finish_reason(chunk) or finish_reason
+		text = chunk.content if hasattr(chunk, "content") else str(chunk)
+		if not isinstance(text, str):
+			text = str(text)
+		parts.append(text)
+		new_steps = parser.feed(text)
+		for raw_step in new_steps:
+			try:
+				step = orjson.loads(raw_step)
+			except orjson.JSONDecodeError:
+				# Malformed steps are recovered by the repair pass on the full response
+				continue
+			steps.append(_normalize_step(step, len(steps) + 1))
+		if new_steps:
+			yield {"language": language, "summary": "", "steps": steps[:]}
+
+	result = _normalize_analysis(safe_json_loads("".join(parts)), language)
+	yield _store_result(
+		cache_key, code_text, language, result, use_semantic_cache, prompt_level, finish_reason == "length"
+	)
+
+
+_DEBUGGER_SYSTEM_PROMPT = """You are an expert debugging assistant. Identify syntax, runtime, and logic errors in code. Explain the root cause in plain language and propose safe, actionable fixes. Provide a fully corrected version of the code that applies those fixes. Return ONLY strict JSON matching the required schema.
 
 Analyze potential issues WITHOUT executing the code. Provide a JSON object with this exact structure:
-{{
+{
   "issues": [
-    {{
+    {
       "type": "syntax|runtime|logic|style|performance",
       "line": 0,
       "title": "Short human-readable title",
       "explanation": "Clear explanation of the problem and its impact",
       "suggestion": "Concrete fix with example code or steps"
-    }}
+    }
   ],
   "corrected_code": "FULL corrected code with all safe fixes applied"
-}}
+}
 
 Rules:
 - If line cannot be determined, set line to 0.
 - Prefer minimal, safe fixes. Do NOT invent APIs. Provide targeted suggestions.
-- Use only double quotes in JSON.
-"""
-	return system_prompt, user_prompt
+- Use only double quotes in JSON."""
 
 
-def analyze_errors_with_llm(
-	code_text: str,
-	language: str,
-	model_name: str = "llama-3.1-8b-instant",
-	temperature: float = 0.1,
-	max_tokens: int = 3000,
-) -> Dict[str, Any]:
-	api_key = get_groq_api_key()
-	if not api_key:
-		raise RuntimeError("Missing GROQ_API_KEY. Set it in .env or Streamlit secrets to analyze code.")
-
-	llm = ChatGroq(
-		api_key=api_key,
-		model=model_name,
-		temperature=temperature,
-		max_tokens=max_tokens,
-	)
+def _build_debugger_prompts(language: str, code_text: str) -> Tuple[str, str]:
+	return _DEBUGGER_SYSTEM_PROMPT, _code_user_prompt(language, code_text)
 
-	system_prompt, user_prompt = _build_debugger_prompts(language, code_text)
-	messages = [("system", system_prompt), ("user", user_prompt)]
-	response = llm.invoke(messages)
-	content = response.content if hasattr(response, "content") else str(response)
 
-	parsed = safe_json_loads(content)
+def _normalize_issues(parsed: Dict[str, Any], language: str) -> Dict[str, Any]:
 	issues = parsed.get("issues", []) or []
 	# Normalize shape
 	normalized: List[Dict[str, Any]] = []
@@ -271,64 +640,51 @@ def analyze_errors_with_llm(
 	return {"issues": normalized, "corrected_code": corrected_code}
 
 
-def _build_complexity_prompts(language: str, code_text: str) -> Tuple[str, str]:
-	system_prompt = (
-		"You are an algorithms and complexity expert. Estimate precise time and space complexity for functions. "
-		"Identify dominant terms and provide Big-O, with notes on best/average/worst if relevant. "
-		"Detect loops and recursion, and model their growth. Return ONLY strict JSON."
+def analyze_errors_with_llm(
+	code_text: str,
+	language: str,
+	model_name: str = DEFAULT_MODEL,
+	temperature: float = DEBUGGER_TEMPERATURE,
+	max_tokens: int = DEBUGGER_MAX_TOKENS,
+) -> Dict[str, Any]:
+	return _run_analysis(
+		"errors",
+		code_text,
+		language,
+		model_name,
+		temperature,
+		max_tokens,
+		_build_debugger_prompts,
+		_normalize_issues,
 	)
-	user_prompt = f"""
-Language: {language}
-Code:
-<CODE>
-{code_text}
-</CODE>
+
+
+_COMPLEXITY_SYSTEM_PROMPT = """You are an algorithms and complexity expert. Estimate precise time and space complexity for functions. Identify dominant terms and provide Big-O, with notes on best/average/worst if relevant. Detect loops and recursion, and model their growth. Return ONLY strict JSON.
 
 Provide complexity analysis as JSON with this exact structure:
-{{
+{
   "functions": [
-    {{
+    {
       "name": "function_name",
       "time_complexity": "O(n log n)",
       "space_complexity": "O(n)",
       "notes": "Short justification and dominant factors",
-      "loops": [{{"location": "line 23", "complexity": "O(n)", "explanation": "for loop over n items"}}],
-      "recursions": [{{"location": "line 45", "recurrence": "T(n)=2T(n/2)+n", "solution": "O(n log n)"}}]
-    }}
+      "loops": [{"location": "line 23", "complexity": "O(n)", "explanation": "for loop over n items"}],
+      "recursions": [{"location": "line 45", "recurrence": "T(n)=2T(n/2)+n", "solution": "O(n log n)"}]
+    }
   ]
-}}
+}
 
 Rules:
 - If names are unknown, infer reasonable names like "main".
-- Use only double quotes in JSON.
-"""
-	return system_prompt, user_prompt
+- Use only double quotes in JSON."""
 
 
-def analyze_complexity_with_llm(
-	code_text: str,
-	language: str,
-	model_name: str = "llama-3.1-8b-instant",
-	temperature: float = 0.1,
-	max_tokens: int = 3500,
-) -> Dict[str, Any]:
-	api_key = get_groq_api_key()
-	if not api_key:
-		raise RuntimeError("Missing GROQ_API_KEY. Set it in .env or Streamlit secrets to analyze code.")
-
-	llm = ChatGroq(
-		api_key=api_key,
-		model=model_name,
-		temperature=temperature,
-		max_tokens=max_tokens,
-	)
+def _build_complexity_prompts(language: str, code_text: str) -> Tuple[str, str]:
+	return _COMPLEXITY_SYSTEM_PROMPT, _code_user_prompt(language, code_text)
 
-	system_prompt, user_prompt = _build_complexity_prompts(language, code_text)
-	messages = [("system", system_prompt), ("user", user_prompt)]
-	response = llm.invoke(messages)
-	content = response.content if hasattr(response, "content") else str(response)
 
-	parsed = safe_json_loads(content)
+def _normalize_complexity(parsed: Dict[str, Any], language: str) -> Dict[str, Any]:
 	functions = parsed.get("functions", []) or []
 	normalized: List[Dict[str, Any]] = []
 	for fn in functions:
@@ -343,3 +699,127 @@ def analyze_complexity_with_llm(
 			}
 		)
 	return {"functions": normalized}
+
+
+def analyze_complexity_with_llm(
+	code_text: str,
+	language: str,
+	model_name: str = DEFAULT_MODEL,
+	temperature: float = COMPLEXITY_TEMPERATURE,
+	max_tokens: int = COMPLEXITY_MAX_TOKENS,
+) -> Dict[str, Any]:
+	return _run_analysis(
+		"complexity",
+		code_text,
+		language,
+		model_name,
+		temperature,
+		max_tokens,
+		_build_complexity_prompts,
+		_normalize_complexity,
+	)
+
+
+async def analyze_all_async(
+	code_text: str,
+	language: str,
+	model_name: str = DEFAULT_MODEL,
+	prompt_level: PromptLevel = "standard",
+	refresh: bool = False,
+	use_semantic_cache: bool = False,
+) -> Dict[str, Dict[str, Any]]:
+	# Execution trace, debugger scan and complexity estimate are independent requests
+	analysis, errors, complexity = await asyncio.gather(
+		_arun_analysis(
+			"code",
+			code_text,
+			language,
+			model_name,
+			TRACE_TEMPERATURE,
+			TRACE_MAX_TOKENS,
+			partial(build_prompts, prompt_level=prompt_level),
+			_normalize_analysis,
+			use_semantic_cache=use_semantic_cache,
+			prompt_level=prompt_level,
+			refresh=refresh,
+		),
+		_arun_analysis(
+			"errors",
+			code_text,
+			language,
+			model_name,
+			DEBUGGER_TEMPERATURE,
+			DEBUGGER_MAX_TOKENS,
+			_build_debugger_prompts,
+			_normalize_issues,
+			refresh=refresh,
+		),
+		_arun_analysis(
+			"complexity",
+			code_text,
+			language,
+			model_name,
+			COMPLEXITY_TEMPERATURE,
+			COMPLEXITY_MAX_TOKENS,
+			_build_complexity_prompts,
+			_normalize_complexity,
+			refresh=refresh,
+		),
+	)
+	return {"analysis": analysis, "errors": errors, "complexity": complexity}
+
+
+async def analyze_code_batch_async(
+	snippets: List[Tuple[str, str]],
+	model_name: str = DEFAULT_MODEL,
+	prompt_level: PromptLevel = "standard",
+	max_concurrency: int = 8,
+	use_semantic_cache: bool = False,
+) -> List[Dict[str, Any]]:
+	# Snippets are (code_text, language) pairs. Cache hits return immediately; misses run
+	# concurrently over the shared client's connection pool. A failed snippet yields
+	# {"language", "summary": "", "steps": [], "error"} instead of failing the whole batch.
+	semaphore = asyncio.Semaphore(max_concurrency)
+
+	async def _analyze_one(code_text: str, language: str) -> Dict[str, Any]:
+		async with semaphore:
+			try:
+				return await _arun_analysis(
+					"code",
+					code_text,
+					language,
+					model_name,
+					TRACE_TEMPERATURE,
+					TRACE_MAX_TOKENS,
+					partial(build_prompts, prompt_level=prompt_level),
+					_normalize_analysis,
+					use_semantic_cache=use_semantic_cache,
+					prompt_level=prompt_level,
+				)
+			except Exception as e:
+				return {"language": language, "summary": "", "steps": [], "error": str(e)}
+
+	return list(await asyncio.gather(*(_analyze_one(code_text, language) for code_text, language in snippets)))
+
+
+def analyze_code_batch(
+	snippets: List[Tuple[str, str]],
+	model_name: str = DEFAULT_MODEL,
+	prompt_level: PromptLevel = "standard",
+	max_concurrency: int = 8,
+	use_semantic_cache: bool = False,
+) -> List[Dict[str, Any]]:
+	return run_async(
+		analyze_code_batch_async(snippets, model_name, prompt_level, max_concurrency, use_semantic_cache)
+	)
+
+
+def analyze_all(
+	code_text: str,
+	language: str,
+	model_name: str = DEFAULT_MODEL,
+	prompt_level: PromptLevel = "standard",
+	refresh: bool = False,
+	use_semantic_cache: bool = False,
+) -> Dict[str, Dict[str, Any]]:
+	return run_async(analyze_all_async(code_text, language, model_name, prompt_level, refresh, use_semantic_cache))
@@ -0,0 +1,60 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import orjson
+from diskcache import Cache
+
+CACHE_DIR = os.getenv("LLM_CACHE_DIR", ".llm_cache")
+
+_cache: Optional[Cache] = None
+
+# Hot entries are also kept in process as their serialized bytes, so a repeat within a
+# session skips SQLite; decoding per hit still hands every caller its own dict
+_MEMORY_MAX_ENTRIES = 128
+_memory: "OrderedDict[str, bytes]" = OrderedDict()
+# Session threads and the background event loop thread share _memory
+_memory_lock = threading.Lock()
+
+
+def _get_cache() -> Cache:
+	global _cache
+	if _cache is None:
+		_cache = Cache(CACHE_DIR)
+	return _cache
+
+
+def _remember(key: str, raw: bytes) -> None:
+	with _memory_lock:
+		_memory[key] = raw
+		_memory.move_to_end(key)
+		if len(_memory) > _MEMORY_MAX_ENTRIES:
+			_memory.popitem(last=False)
+
+
+def get(key: str) -> Optional[Dict[str, Any]]:
+	with _memory_lock:
+		raw = _memory.get(key)
+		if raw is not None:
+			_memory.move_to_end(key)
+	if raw is not None:
+		return orjson.loads(raw)
+	# A broken or locked cache must never block an analysis; treat it as a miss
+	try:
+		raw = _get_cache().get(key)
+		if raw is None:
+			return None
+		_remember(key, raw)
+		return orjson.loads(raw)
+	except Exception:
+		return None
+
+
+def put(key: str, value: Dict[str, Any]) -> None:
+	try:
+		raw = orjson.dumps(value)
+		_remember(key, raw)
+		_get_cache().set(key, raw)
+	except Exception:
+		pass
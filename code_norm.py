@@ -0,0 +1,107 @@
+import io
+import tokenize
+from functools import lru_cache
+from typing import Iterable, List, Optional, Tuple
+
+# Selected UI language -> tree-sitter grammar name
+_TREE_SITTER_NAMES = {
+	"python": "python",
+	"javascript": "javascript",
+	"cpp": "cpp",
+	"java": "java",
+	"csharp": "c_sharp",
+	"go": "go",
+	"rust": "rust",
+	"ruby": "ruby",
+}
+_SKIPPED_TOKENS = {
+	tokenize.COMMENT,
+	tokenize.NL,
+	tokenize.NEWLINE,
+	tokenize.INDENT,
+	tokenize.DEDENT,
+	tokenize.ENCODING,
+	tokenize.ENDMARKER,
+}
+
+# A token is (text, start_row, end_row), rows 0-based
+Token = Tuple[str, int, int]
+
+
+@lru_cache(maxsize=None)
+def _get_parser(language: str) -> Optional[object]:
+	name = _TREE_SITTER_NAMES.get(language)
+	if name is None:
+		return None
+	try:
+		from tree_sitter_languages import get_parser  # type: ignore
+		return get_parser(name)
+	except Exception:
+		# tree-sitter is optional; callers fall back to tokenize / whitespace trimming
+		return None
+
+
+def _tree_sitter_tokens(parser: object, code_text: str) -> List[Token]:
+	source = code_text.encode("utf-8")
+	tree = parser.parse(source)  # type: ignore[attr-defined]
+	tokens: List[Token] = []
+	stack = [tree.root_node]
+	while stack:
+		node = stack.pop()
+		if "comment" in node.type:
+			continue
+		# String literals are kept whole so their contents stay part of the key
+		if node.child_count == 0 or "string" in node.type or node.type.endswith("literal"):
+			text = source[node.start_byte : node.end_byte].decode("utf-8", errors="replace")
+			if text:
+				tokens.append((text, node.start_point[0], node.end_point[0]))
+			continue
+		stack.extend(reversed(node.children))
+	return tokens
+
+
+def _python_tokens(code_text: str) -> Optional[List[Token]]:
+	try:
+		readline = io.StringIO(code_text).readline
+		return [
+			(tok.string, tok.start[0] - 1, tok.end[0] - 1)
+			for tok in tokenize.generate_tokens(readline)
+			if tok.type not in _SKIPPED_TOKENS
+		]
+	except (tokenize.TokenError, IndentationError, SyntaxError):
+		return None
+
+
+def _join_tokens(tokens: Iterable[Token], source_lines: List[str]) -> str:
+	# Tokens on the same line are joined by one space; a token on a later line starts
+	# after the same number of newlines plus that line's original indentation, so
+	# line numbers in cached steps still match the submitted code
+	parts: List[str] = []
+	previous_end_row: Optional[int] = None
+	for text, start_row, end_row in tokens:
+		if previous_end_row is None or start_row > previous_end_row:
+			line = source_lines[start_row] if start_row < len(source_lines) else ""
+			indent = line[: len(line) - len(line.lstrip())]
+			parts.append("\n" * (start_row - (previous_end_row or 0)) + indent)
+		else:
+			parts.append(" ")
+		parts.append(text)
+		previous_end_row = end_row
+	return "".join(parts)
+
+
+@lru_cache(maxsize=64)
+def canonical(code_text: str, language: str) -> str:
+	# Drops comments and spacing inside lines but keeps line breaks and indentation,
+	# so snippets differing only in comments or formatting share cache entries
+	source_lines = code_text.splitlines()
+	tokens: Optional[List[Token]] = None
+	parser = _get_parser(language)
+	if parser is not None:
+		tokens = _tree_sitter_tokens(parser, code_text)
+	elif language == "python":
+		tokens = _python_tokens(code_text)
+	if tokens is None:
+		# Without a tokenizer comments cannot be told apart from strings safely
+		return "\n".join(line.rstrip() for line in source_lines).rstrip("\n")
+	return _join_tokens(tokens, source_lines)
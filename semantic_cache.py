@@ -0,0 +1,234 @@
+import asyncio
+import copy
+import os
+import pickle
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import analyzer_cache
+from code_norm import canonical as _canonicalize
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+EMBEDDING_DIM = 384
+SIMILARITY_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.9"))
+MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "512"))
+INDEX_PATH = os.path.join(analyzer_cache.CACHE_DIR, "semantic_index.pkl")
+
+# Neighbours inspected per lookup; the nearest one may belong to another language
+_SEARCH_K = 8
+_MAX_PENDING = 32
+BATCH_SIZE = 8
+BATCH_WINDOW = 0.02
+
+_lock = threading.Lock()
+_model: Any = None
+_index: Any = None
+_disabled = False
+_next_id = 0
+# entry id -> (language, prompt_level, line_count, embedding, result, canonical), oldest first for LRU eviction
+_entries: "OrderedDict[int, Tuple[str, str, int, Any, Dict[str, Any], str]]" = OrderedDict()
+# (canonical, language, prompt_level) -> entry id, so re-adding the same code replaces its entry
+_ids_by_key: Dict[Tuple[str, str, str], int] = {}
+# canonical text -> embedding computed by lookup(), reused by the add() that follows a miss
+_pending: Dict[str, Any] = {}
+
+
+def _ensure_loaded() -> bool:
+	global _model, _index, _disabled, _next_id
+	if _disabled:
+		return False
+	if _index is not None:
+		return True
+	try:
+		import faiss  # type: ignore
+		import numpy as np
+		from sentence_transformers import SentenceTransformer  # type: ignore
+	except ImportError:
+		# Optional feature: without the embedding stack only the exact cache is used
+		_disabled = True
+		return False
+	try:
+		_model = SentenceTransformer(MODEL_NAME)
+	except Exception:
+		# e.g. the model weights cannot be downloaded; fall back to the exact cache
+		_disabled = True
+		return False
+	_index = faiss.IndexIDMap2(faiss.IndexFlatIP(EMBEDDING_DIM))
+	try:
+		with open(INDEX_PATH, "rb") as f:
+			_next_id, saved = pickle.load(f)
+	except Exception:
+		saved = []
+	for item in saved:
+		# Entries saved in an older layout (no prompt_level or canonical text) are dropped
+		if len(item) != 7:
+			continue
+		entry_id, language, prompt_level, line_count, embedding, result, canonical = item
+		_entries[entry_id] = (language, prompt_level, line_count, embedding, result, canonical)
+		_ids_by_key[(canonical, language, prompt_level)] = entry_id
+	if _entries:
+		ids = np.array(list(_entries.keys()), dtype="int64")
+		vectors = np.stack([entry[3] for entry in _entries.values()])
+		_index.add_with_ids(vectors, ids)
+	return True
+
+
+def _save() -> None:
+	saved = [(entry_id, *entry) for entry_id, entry in _entries.items()]
+	try:
+		os.makedirs(os.path.dirname(INDEX_PATH) or ".", exist_ok=True)
+		with open(INDEX_PATH, "wb") as f:
+			pickle.dump((_next_id, saved), f)
+	except Exception:
+		pass
+
+
+def _embed_many(canonicals: List[str]) -> Any:
+	vectors = _model.encode(
+		canonicals, batch_size=len(canonicals), convert_to_numpy=True, normalize_embeddings=True
+	)
+	return vectors.astype("float32")
+
+
+def _embed(canonical: str) -> Any:
+	return _embed_many([canonical])[0]
+
+
+def _search(
+	canonical: str, embedding: Any, language: str, prompt_level: str, line_count: int, threshold: float
+) -> Optional[Dict[str, Any]]:
+	# Caller holds _lock
+	if len(_pending) >= _MAX_PENDING:
+		_pending.clear()
+	_pending[canonical] = embedding
+	if not _entries:
+		return None
+	scores, ids = _index.search(embedding.reshape(1, -1), min(_SEARCH_K, len(_entries)))
+	for score, entry_id in zip(scores[0], ids[0]):
+		if score < threshold:
+			break
+		entry = _entries.get(int(entry_id))
+		# Steps reference line numbers, so only reuse traces of equally long snippets;
+		# a trace is only reused for the detail level it was generated at
+		if entry is None or entry[0] != language or entry[1] != prompt_level or entry[2] != line_count:
+			continue
+		_entries.move_to_end(int(entry_id))
+		del _pending[canonical]
+		return copy.deepcopy(entry[4])
+	return None
+
+
+def lookup(
+	code_text: str, language: str, prompt_level: str = "standard", threshold: float = SIMILARITY_THRESHOLD
+) -> Optional[Dict[str, Any]]:
+	with _lock:
+		if not _ensure_loaded():
+			return None
+		canonical = _canonicalize(code_text, language)
+		embedding = _embed(canonical)
+		return _search(canonical, embedding, language, prompt_level, len(code_text.splitlines()), threshold)
+
+
+def _encode_batch(canonicals: List[str]) -> List[Any]:
+	with _lock:
+		if not _ensure_loaded():
+			return [None] * len(canonicals)
+		return list(_embed_many(canonicals))
+
+
+class _EmbeddingBatcher:
+	# Collects embedding requests from concurrent coroutines and encodes them in one
+	# model call, flushing after BATCH_WINDOW seconds or once BATCH_SIZE are queued
+
+	def __init__(self) -> None:
+		self._queue: "asyncio.Queue[Tuple[str, asyncio.Future]]" = asyncio.Queue()
+		self._task = asyncio.get_running_loop().create_task(self._run())
+
+	async def embed(self, canonical: str) -> Any:
+		future = asyncio.get_running_loop().create_future()
+		await self._queue.put((canonical, future))
+		return await future
+
+	async def _run(self) -> None:
+		loop = asyncio.get_running_loop()
+		while True:
+			batch = [await self._queue.get()]
+			deadline = loop.time() + BATCH_WINDOW
+			while len(batch) < BATCH_SIZE:
+				remaining = deadline - loop.time()
+				if remaining <= 0:
+					break
+				try:
+					batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+				except asyncio.TimeoutError:
+					break
+			try:
+				# Encoding is CPU-bound; keep it off the event loop
+				vectors = await asyncio.to_thread(_encode_batch, [canonical for canonical, _ in batch])
+			except Exception as e:
+				for _, future in batch:
+					if not future.done():
+						future.set_exception(e)
+				continue
+			for (_, future), vector in zip(batch, vectors):
+				if not future.done():
+					future.set_result(vector)
+
+
+_batchers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _EmbeddingBatcher]" = weakref.WeakKeyDictionary()
+
+
+async def alookup(
+	code_text: str, language: str, prompt_level: str = "standard", threshold: float = SIMILARITY_THRESHOLD
+) -> Optional[Dict[str, Any]]:
+	if _disabled:
+		return None
+	loop = asyncio.get_running_loop()
+	batcher = _batchers.get(loop)
+	if batcher is None:
+		batcher = _batchers[loop] = _EmbeddingBatcher()
+	canonical = _canonicalize(code_text, language)
+	embedding = await batcher.embed(canonical)
+	if embedding is None:
+		return None
+
+	def _locked_search() -> Optional[Dict[str, Any]]:
+		with _lock:
+			return _search(canonical, embedding, language, prompt_level, len(code_text.splitlines()), threshold)
+
+	return await asyncio.to_thread(_locked_search)
+
+
+def add(code_text: str, language: str, result: Dict[str, Any], prompt_level: str = "standard") -> None:
+	global _next_id
+	with _lock:
+		if not _ensure_loaded():
+			return
+		import numpy as np
+
+		canonical = _canonicalize(code_text, language)
+		embedding = _pending.pop(canonical, None)
+		if embedding is None:
+			embedding = _embed(canonical)
+		key = (canonical, language, prompt_level)
+		evicted: List[int] = []
+		# A forced re-analysis replaces the stale trace instead of indexing a second copy
+		previous_id = _ids_by_key.pop(key, None)
+		if previous_id is not None and _entries.pop(previous_id, None) is not None:
+			evicted.append(previous_id)
+		entry_id = _next_id
+		_next_id += 1
+		_entries[entry_id] = (
+			language, prompt_level, len(code_text.splitlines()), embedding, copy.deepcopy(result), canonical
+		)
+		_ids_by_key[key] = entry_id
+		_index.add_with_ids(embedding.reshape(1, -1), np.array([entry_id], dtype="int64"))
+		while len(_entries) > MAX_ENTRIES:
+			oldest_id, oldest = _entries.popitem(last=False)
+			_ids_by_key.pop((oldest[5], oldest[0], oldest[1]), None)
+			evicted.append(oldest_id)
+		if evicted:
+			_index.remove_ids(np.array(evicted, dtype="int64"))
+		_save()
@@ -1,28 +1,47 @@
 import os
 import time
-import json
 import base64
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List
 
+import orjson
 import streamlit as st
-from dotenv import load_dotenv
-from langchain_groq import ChatGroq
 
-from analyzer import analyze_code_with_llm, get_groq_api_key
+from analyzer import PROMPT_LEVELS, analyze_all, analyze_code_batch, get_groq_api_key, stream_code_analysis
+from ui_utils import (
+    build_highlighted_code_block,
+    build_step_html,
+    compute_variable_changes,
+    escape_value,
+    format_summary,
+    render_step_panels,
+)
 
 
 # ----- Environment & Config -----
-load_dotenv()
+# .env is loaded once per process when analyzer is imported
+LANGUAGES = ("python", "javascript", "cpp", "java", "csharp", "go", "rust", "ruby")
+LANGUAGE_INDEX = {language: i for i, language in enumerate(LANGUAGES)}
+
+# Header above the highlighted code; only the line number changes between steps
+CODE_EXECUTION_HEADER = (
+    '<div class="card"><h3 style="color: #8b5cf6; margin-bottom: 1rem; display: flex; align-items: center;">'
+    '📍 Code Execution<span style="margin-left: auto; font-size: 0.9rem; color: #a78bfa;">Line {line}</span>'
+    "</h3></div>"
+)
 
 
 # ----- Background Image Function -----
-def set_bg_with_overlay(img_path, overlay_rgba="rgba(0,0,0,0.45)"):
-    """Set background image with overlay for better text readability"""
+@st.cache_resource(show_spinner=False)
+def build_background_css(img_path, overlay_rgba="rgba(0,0,0,0.45)"):
+    """Return the background <style> block and whether the image was found.
+
+    Reading and base64-encoding the image happens once per process; reruns
+    reuse the same string instead of re-encoding ~200 KB each time.
+    """
     try:
         with open(img_path, "rb") as f:
             b64 = base64.b64encode(f.read()).decode()
-        st.markdown(
-            f"""
+        return f"""
             <style>
             .stApp {{
                 background-image: linear-gradient({overlay_rgba}, {overlay_rgba}), url("data:image/png;base64,{b64}");
@@ -41,12 +60,9 @@ def set_bg_with_overlay(img_path, overlay_rgba="rgba(0,0,0,0.45)"):
                 border: 1px solid rgba(147, 51, 234, 0.3);
             }}
             </style>
-            """,
-            unsafe_allow_html=True
-        )
-        return True
+            """, True
     except FileNotFoundError:
-        st.markdown("""
+        return """
         <style>
         .stApp {
             background: linear-gradient(135deg, #8b5cf6 0%, #7c3aed 100%);
@@ -62,103 +78,59 @@ def set_bg_with_overlay(img_path, overlay_rgba="rgba(0,0,0,0.45)"):
             border: 1px solid rgba(147, 51, 234, 0.3);
         }
         </style>
-        """, unsafe_allow_html=True)
-        return False
+        """, False
+
+
+def set_bg_with_overlay(img_path, overlay_rgba="rgba(0,0,0,0.45)"):
+    """Set background image with overlay for better text readability"""
+    css, loaded = build_background_css(img_path, overlay_rgba)
+    # Streamlit drops elements a rerun does not emit, so the style is written every run
+    st.markdown(css, unsafe_allow_html=True)
+    return loaded
 
 
 # ----- Session State Initialization -----
-if "code" not in st.session_state:
-    st.session_state.code = ""
-if "language" not in st.session_state:
-    st.session_state.language = "python"
-if "analysis" not in st.session_state:
-    st.session_state.analysis = None  # type: Optional[Dict[str, Any]]
-if "steps" not in st.session_state:
-    st.session_state.steps = []  # type: List[Dict[str, Any]]
-if "current_step" not in st.session_state:
-    st.session_state.current_step = 0
-if "playing" not in st.session_state:
-    st.session_state.playing = False
-if "last_tick" not in st.session_state:
-    st.session_state.last_tick = time.time()
-if "autoplay_interval" not in st.session_state:
-    st.session_state.autoplay_interval = 3.0
-if "history" not in st.session_state:
-    st.session_state.history = []  # type: List[Dict[str, Any]]
+# Built on every run so each new session gets its own list objects
+_SESSION_DEFAULTS: Dict[str, Any] = {
+    "code": "",
+    "language": "python",
+    "analysis": None,
+    "steps": [],
+    "var_changes": [],
+    "step_html": [],
+    "current_step": 0,
+    "playing": False,
+    "last_tick": time.time(),
+    "autoplay_interval": 3.0,
+    "history": [],
+    "prompt_level": "standard",
+}
+for _key, _value in _SESSION_DEFAULTS.items():
+    st.session_state.setdefault(_key, _value)
 
 
 # ----- Utility Functions -----
-def build_highlighted_code_block(code_text: str, current_line: Optional[int], language: str) -> str:
-    """Return HTML that renders code lines with the current line highlighted.
-
-    Uses <mark> for the active line index (1-based). Falls back gracefully if line
-    number is out of range. Shows context around the current line.
+@st.cache_data(ttl=3600, max_entries=128, show_spinner=False)
+def cached_stream_analysis(
+    code_text: str, language: str, prompt_level: str, _refresh: bool = False
+) -> Dict[str, Any]:
+    """Stream an analysis with a live step counter and memoize the final result.
+
+    A repeated click or rerun with the same inputs returns the stored result
+    without touching the analyzer (or its disk cache) at all. The counter lives
+    inside the function so Streamlit can replay it on a cache hit. ``_refresh``
+    (not part of the cache key) also bypasses the analyzer's caches; clear this
+    function's entry first so it actually runs.
     """
-    lines = code_text.splitlines()
-    html_lines: List[str] = []
-    
-    # Show context around current line (3 lines before and after)
-    start_idx = max(0, (current_line or 1) - 4)
-    end_idx = min(len(lines), (current_line or 1) + 3)
-    
-    for idx in range(start_idx, end_idx):
-        line_num = idx + 1
-        line_content = lines[idx]
-        
-        # Create line number with padding
-        line_num_str = f"{line_num:3d}"
-        
-        if current_line == line_num:
-            html_lines.append(f"<div style='background:#fff3bf;border-left:4px solid #ff6b6b;padding-left:8px;'><span style='color:#666;margin-right:12px;'>{line_num_str}</span><code>{escape_html(line_content)}</code></div>")
-        else:
-            html_lines.append(f"<div><span style='color:#999;margin-right:12px;'>{line_num_str}</span><code>{escape_html(line_content)}</code></div>")
-    
-    # Wrap with a container mimicking code styling
-    html = (
-        "<div style=\"font-family:Menlo,Consolas,monospace;font-size:13px;"
-        "line-height:1.4;border:1px solid #ddd;border-radius:8px;"
-        "padding:16px;background:#f8f9fa;overflow-x:auto;box-shadow:0 2px 4px rgba(0,0,0,0.1);\">"
-        + "\n".join(html_lines)
-        + "</div>"
-    )
-    return html
-
-
-def escape_html(text: str) -> str:
-    return (
-        text.replace("&", "&amp;")
-        .replace("<", "&lt;")
-        .replace(">", "&gt;")
-        .replace('"', "&quot;")
-        .replace("'", "&#39;")
-    )
-
-
-def format_summary(summary_text: str) -> str:
-    """Format the summary text with better structure and readability"""
-    paragraphs = [p.strip() for p in summary_text.split('\n\n') if p.strip()]
-    
-    formatted_html = ""
-    for i, paragraph in enumerate(paragraphs):
-        # Check if paragraph starts with a number (like "1)", "2)", etc.)
-        if paragraph and paragraph[0].isdigit() and ')' in paragraph[:3]:
-            formatted_html += f"""
-            <div style="margin-bottom: 1.2rem; line-height: 1.7; padding: 1rem; 
-                        background: rgba(147, 51, 234, 0.1); border-left: 4px solid #8b5cf6; 
-                        border-radius: 8px;">
-                <strong style="color: #8b5cf6; font-size: 1.1rem;">{paragraph}</strong>
-            </div>
-            """
-        else:
-            formatted_html += f"""
-            <div style="margin-bottom: 1.2rem; line-height: 1.7; padding: 1rem; 
-                        background: rgba(147, 51, 234, 0.05); border-radius: 8px; 
-                        text-align: justify;">
-                {paragraph}
-            </div>
-            """
-    
-    return formatted_html
+    progress_slot = st.empty()
+    analysis: Dict[str, Any] = {}
+    for analysis in stream_code_analysis(code_text, language, prompt_level=prompt_level, refresh=_refresh):
+        steps = analysis.get("steps", [])
+        # Preview the newest step so the trace is readable while it is still generating
+        latest = f" · line {steps[-1].get('line', '?')}: {steps[-1].get('operation', '')}" if steps else ""
+        progress_slot.caption(f"🧩 {len(steps)} step(s) received{latest}...")
+    progress_slot.empty()
+    return analysis
 
 
 # ----- UI -----
@@ -260,6 +232,40 @@ st.markdown("""
         border-color: rgba(168, 85, 247, 0.75) !important;
         box-shadow: 0 6px 18px rgba(168, 85, 247, 0.25);
     }
+
+    /* Visualization list items, shared so each rendered row carries only a class */
+    .ds-current {
+        background: #fff3bf;
+        padding: 0.5rem;
+        border-radius: 4px;
+        border-left: 4px solid #ff6b6b;
+        margin: 0.25rem 0;
+    }
+    .ds-other {
+        background: #f8f9fa;
+        padding: 0.5rem;
+        border-radius: 4px;
+        margin: 0.25rem 0;
+    }
+    .var-changed {
+        background: rgba(147, 51, 234, 0.2);
+        padding: 0.75rem;
+        border-radius: 6px;
+        border-left: 4px solid #a855f7;
+        margin: 0.5rem 0;
+    }
+    .var-changed code {
+        background: rgba(147, 51, 234, 0.3);
+        padding: 0.2rem 0.4rem;
+        border-radius: 3px;
+    }
+    .var-unchanged {
+        background: rgba(147, 51, 234, 0.1);
+        padding: 0.5rem;
+        border-radius: 6px;
+        margin: 0.25rem 0;
+        color: #a78bfa;
+    }
 </style>
 """, unsafe_allow_html=True)
 
@@ -291,7 +297,7 @@ if nav_choice == "History":
 
     if export_clicked:
         try:
-            history_json = json.dumps(st.session_state.history, indent=2)
+            history_json = orjson.dumps(st.session_state.history, option=orjson.OPT_INDENT_2)
             st.download_button(
                 label="Download history.json",
                 data=history_json,
@@ -344,7 +350,7 @@ if nav_choice == "Debugger":
     with dbg_col1:
         dbg_language = st.selectbox(
             "🔤 Programming Language (for analysis)",
-            options=["python", "javascript", "cpp", "java", "csharp", "go", "rust", "ruby"],
+            options=LANGUAGES,
             index=0,
             help="Select language to guide error detection"
         )
@@ -480,7 +486,7 @@ if nav_choice == "Complexity":
     with cx_col1:
         cx_language = st.selectbox(
             "🔤 Programming Language (for analysis)",
-            options=["python", "javascript", "cpp", "java", "csharp", "go", "rust", "ruby"],
+            options=LANGUAGES,
             index=0,
             help="Select language to guide complexity analysis"
         )
@@ -589,41 +595,52 @@ st.markdown("""
 # Code Input Section
 st.markdown('<h2 class="section-header">📝 Code Input</h2>', unsafe_allow_html=True)
 
-# Create two columns for language selection and analyze button
-col1, col2, col3 = st.columns([2, 1, 1])
+# The inputs only sync when the form is submitted, so typing or pasting code
+# does not rerun the page (and the visualization below) on every edit
+with st.form("code_form", clear_on_submit=False, border=False):
+    # Create two columns for language selection and analyze button
+    col1, col2, col3 = st.columns([2, 1, 1])
+
+    with col1:
+        # Unknown languages (e.g. from an old history entry) fall back to python
+        language_index = LANGUAGE_INDEX.get(st.session_state.language, 0)
+    st.session_state.language = st.selectbox(
+            "🔤 Programming Language",
+            options=LANGUAGES,
+            index=language_index,
+            help="Select the programming language of your code",
+        )
 
-with col1:
-    # Normalize language selection and ensure a valid index
-    languages = ["python", "javascript", "cpp", "java", "csharp", "go", "rust", "ruby"]
-    current_language = (
-        st.session_state.language if st.session_state.language in languages else "python"
-    )
-st.session_state.language = st.selectbox(
-        "🔤 Programming Language",
-        options=languages,
-        index=languages.index(current_language),
-        help="Select the programming language of your code",
-    )
+    with col2:
+        st.session_state.prompt_level = st.selectbox(
+            "📝 Detail Level",
+            options=PROMPT_LEVELS,
+            index=PROMPT_LEVELS.index(st.session_state.prompt_level),
+            help="How much detail the summary and step explanations should contain",
+        )
+        include_scans = st.checkbox(
+            "➕ Debugger & Complexity",
+            help="Also scan for issues and estimate complexity; all three analyses run concurrently",
+        )
+        force_refresh = st.checkbox(
+            "🔁 Force re-analyze",
+            help="Ignore cached results for this code and ask the model again",
+        )
 
-with col2:
-    st.markdown("") # Spacer
-    st.markdown("") # Spacer
-
-with col3:
-    analyze_clicked = st.button(
-        "🚀 Analyze Code", 
-        type="primary", 
-        disabled=not bool(st.session_state.code),
-        use_container_width=True,
-        help="Start the AI-powered code analysis"
-    )
+    with col3:
+        analyze_clicked = st.form_submit_button(
+            "🚀 Analyze Code", 
+            type="primary", 
+            use_container_width=True,
+            help="Start the AI-powered code analysis"
+        )
 
-# Code input area with better styling
-st.session_state.code = st.text_area(
-    "💻 Your Code",
-    value=st.session_state.code,
-    height=300,
-    placeholder="""# Paste your code here to visualize its execution step by step
+    # Code input area with better styling
+    st.session_state.code = st.text_area(
+        "💻 Your Code",
+        value=st.session_state.code,
+        height=300,
+        placeholder="""# Paste your code here to visualize its execution step by step
 
 # Example:
 def fibonacci(n):
@@ -633,18 +650,37 @@ def fibonacci(n):
 
 result = fibonacci(5)
 print(f"Fibonacci(5) = {result}")""",
-    help="Enter your code to see how it executes step by step"
-)
+        help="Enter your code to see how it executes step by step"
+    )
+
+if analyze_clicked and not st.session_state.code:
+    # The code only arrives with the submit, so the button can't be disabled up front
+    st.warning("Paste some code to analyze first.")
+    analyze_clicked = False
 
 if analyze_clicked:
     with st.spinner("🧠 AI is analyzing your code..."):
         try:
-            analysis = analyze_code_with_llm(
-                st.session_state.code,
-                st.session_state.language,
-            )
+            scans = None
+            cache_args = (st.session_state.code, st.session_state.language, st.session_state.prompt_level)
+            if force_refresh:
+                # Drop the memoized trace too, so later plain clicks see the fresh result
+                cached_stream_analysis.clear(*cache_args)
+            if include_scans:
+                scans = analyze_all(
+                    st.session_state.code,
+                    st.session_state.language,
+                    prompt_level=st.session_state.prompt_level,
+                    refresh=force_refresh,
+                )
+                analysis = scans["analysis"]
+            else:
+                # Stream the response so progress is visible while steps are still being generated
+                analysis = cached_stream_analysis(*cache_args, _refresh=force_refresh)
             st.session_state.analysis = analysis
             st.session_state.steps = analysis.get("steps", [])
+            st.session_state.var_changes = compute_variable_changes(st.session_state.steps)
+            st.session_state.step_html = build_step_html(st.session_state.steps)
             st.session_state.current_step = 0
             st.session_state.playing = False
 
@@ -663,9 +699,45 @@ if analyze_clicked:
                     "summary": summary_text,
                 }
                 st.session_state.history.append(history_item)
+                if scans:
+                    issue_count = len(scans["errors"].get("issues", []))
+                    dbg_item = {
+                        "id": f"dbg-{ts}-{len(st.session_state.history)+1}",
+                        "timestamp": ts,
+                        "timestamp_readable": readable,
+                        "language": st.session_state.language,
+                        "code": st.session_state.code,
+                        "num_steps": 0,
+                        "summary": f"Debugger scan: {issue_count} issue(s) detected.",
+                        "kind": "debugger",
+                        "issues": scans["errors"].get("issues", []),
+                    }
+                    if scans["errors"].get("corrected_code"):
+                        dbg_item["corrected_code"] = scans["errors"]["corrected_code"]
+                    st.session_state.history.append(dbg_item)
+                    fn_count = len(scans["complexity"].get("functions", []))
+                    st.session_state.history.append({
+                        "id": f"cx-{ts}-{len(st.session_state.history)+1}",
+                        "timestamp": ts,
+                        "timestamp_readable": readable,
+                        "language": st.session_state.language,
+                        "code": st.session_state.code,
+                        "num_steps": 0,
+                        "summary": f"Complexity analysis: {fn_count} function(s) analyzed.",
+                        "kind": "complexity",
+                        "complexity": scans["complexity"],
+                    })
             except Exception as _:
                 pass
 
+            if scans:
+                st.info("Debugger and Complexity results were saved to History.")
+
+            if analysis.get("truncated"):
+                # st.cache_data can't skip a result, so drop the entry this call just memoized
+                cached_stream_analysis.clear(*cache_args)
+                st.warning("The trace hit the model's output limit and may be incomplete, so it was not cached.")
+
             # Success message with better styling
             st.markdown("""
             <div style="background: rgba(147, 51, 234, 0.9);
@@ -680,6 +752,8 @@ if analyze_clicked:
         except Exception as e:
             st.session_state.analysis = None
             st.session_state.steps = []
+            st.session_state.var_changes = []
+            st.session_state.step_html = []
             st.session_state.current_step = 0
             st.session_state.playing = False
 
@@ -695,6 +769,50 @@ if analyze_clicked:
             </div>
             """, unsafe_allow_html=True)
 
+# Batch analysis, e.g. for comparing snippets or re-running a set of examples
+with st.expander("📦 Batch Analysis (JSONL)", expanded=False):
+    batch_file = st.file_uploader(
+        "Snippets file",
+        type=["jsonl"],
+        help='One JSON object per line: {"code": "...", "language": "python"}. '
+             "The language defaults to the one selected above.",
+    )
+    run_batch = st.button("🚀 Analyze Batch", disabled=batch_file is None, use_container_width=True)
+    if run_batch and batch_file is not None:
+        snippets = []
+        for raw_line in batch_file.getvalue().splitlines():
+            if not raw_line.strip():
+                continue
+            try:
+                item = orjson.loads(raw_line)
+                snippets.append((item["code"], item.get("language", st.session_state.language)))
+            except (orjson.JSONDecodeError, KeyError, TypeError, AttributeError):
+                continue
+        if not snippets:
+            st.warning("No valid snippets found in the file.")
+        else:
+            with st.spinner(f"🧠 Analyzing {len(snippets)} snippet(s) concurrently..."):
+                results = analyze_code_batch(snippets, prompt_level=st.session_state.prompt_level)
+            ts = int(time.time())
+            readable = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts))
+            failed = 0
+            for (code, language), result in zip(snippets, results):
+                if result.get("error"):
+                    failed += 1
+                    continue
+                st.session_state.history.append({
+                    "id": f"{ts}-{len(st.session_state.history)+1}",
+                    "timestamp": ts,
+                    "timestamp_readable": readable,
+                    "language": language,
+                    "code": code,
+                    "num_steps": len(result.get("steps", [])),
+                    "summary": result.get("summary", ""),
+                })
+            st.success(f"✅ {len(snippets) - failed} snippet(s) analyzed and saved to History.")
+            if failed:
+                st.warning(f"{failed} snippet(s) failed to analyze.")
+
 # Visualization Section
 st.markdown('<h2 class="section-header">🎬 Code Execution Visualization</h2>', unsafe_allow_html=True)
 
@@ -711,370 +829,264 @@ if st.session_state.analysis:
 
 
 
-steps: List[Dict[str, Any]] = st.session_state.steps
-if not steps:
-	st.markdown("""
-	<div class="card" style="text-align: center; padding: 3rem;">
-		<h3 style="color: #8b5cf6; margin-bottom: 1rem;">🚀 Ready to Visualize!</h3>
-		<p style="font-size: 1.1rem; color: #a78bfa;">Paste your code above and click "Analyze Code" to see step-by-step execution visualization.</p>
-	</div>
-	""", unsafe_allow_html=True)
-else:
-	total_steps = len(steps)
-	current_idx = max(0, min(st.session_state.current_step, total_steps - 1))
-	current = steps[current_idx]
-	current_line = current.get("line", None)
-
-	# Enhanced Controls Section
-	st.markdown("""
-	<div class="progress-container">
-	""", unsafe_allow_html=True)
-	
-	# Progress bar with better styling
-	progress_value = (current_idx + 1) / total_steps
-	st.progress(progress_value, text=f"Step {current_idx + 1} of {total_steps}")
-	
-	# Control buttons with modern styling
-	col1, col2, col3, col4, col5 = st.columns([1, 1, 1, 1, 1])
-	
-	with col1:
-		if st.button("⏮️ First", use_container_width=True, help="Go to first step"):
-			st.session_state.current_step = 0
-			st.session_state.playing = False
-			st.rerun()
-	
-	with col2:
-		if st.button("◀️ Prev", use_container_width=True, help="Previous step"):
-			st.session_state.current_step = (current_idx - 1) % total_steps
-			st.session_state.playing = False
-			st.rerun()
-	
-	with col3:
-		# Show different button text based on current state
-		button_text = "⏸️ Pause" if st.session_state.playing else "▶️ Play"
-		button_type = "secondary" if st.session_state.playing else "primary"
-		if st.button(button_text, type=button_type, use_container_width=True, help="Play/Pause auto-advance"):
-			st.session_state.playing = not st.session_state.playing
-			st.session_state.last_tick = time.time()
-			st.rerun()
-	
-	with col4:
-		if st.button("Next ▶️", use_container_width=True, help="Next step"):
-			st.session_state.current_step = (current_idx + 1) % total_steps
-			st.session_state.playing = False
-			st.rerun()
-	
-	with col5:
-		if st.button("⏭️ Last", use_container_width=True, help="Go to last step"):
-			st.session_state.current_step = total_steps - 1
-			st.session_state.playing = False
-			st.rerun()
-
-	# Reset button
-	if st.button("🔄 Reset to Beginning", use_container_width=True, help="Reset to first step"):
-		st.session_state.current_step = 0
-		st.session_state.playing = False
+def go_to_step(step: int) -> None:
+	st.session_state.current_step = step
+	st.session_state.playing = False
+
+
+def toggle_playing() -> None:
+	st.session_state.playing = not st.session_state.playing
+	st.session_state.last_tick = time.time()
+
+
+def render_visualization() -> None:
+	if st.session_state.get("_autoplay_timer") != st.session_state.playing:
+		# Playback was toggled from inside the fragment; a full run re-registers it
+		# with or without its timer
 		st.rerun()
-	
-	st.markdown("</div>", unsafe_allow_html=True)
-	
-	# Status indicator
-	if st.session_state.playing:
+	steps: List[Dict[str, Any]] = st.session_state.steps
+	if not steps:
 		st.markdown("""
-		<div style="background: rgba(147, 51, 234, 0.9); 
-		            backdrop-filter: blur(10px);
-		            color: white; padding: 0.75rem 1.5rem; border-radius: 20px; 
-		            margin: 1rem 0; text-align: center; font-weight: 600;
-		            box-shadow: 0 4px 15px rgba(147, 51, 234, 0.4);
-		            border: 1px solid rgba(255,255,255,0.2);
-		            animation: pulse 2s infinite;">
-			🎬 Auto-playing - Steps advance every 3 seconds
+		<div class="card" style="text-align: center; padding: 3rem;">
+			<h3 style="color: #8b5cf6; margin-bottom: 1rem;">🚀 Ready to Visualize!</h3>
+			<p style="font-size: 1.1rem; color: #a78bfa;">Paste your code above and click "Analyze Code" to see step-by-step execution visualization.</p>
 		</div>
 		""", unsafe_allow_html=True)
-
-	# Code Execution Display
+	else:
+		total_steps = len(steps)
+		if st.session_state.playing:
+			# run_every timing jitters a little; don't drop a tick that arrives early
+			now = time.time()
+			if now - st.session_state.last_tick >= st.session_state.autoplay_interval * 0.9:
+				st.session_state.current_step = (st.session_state.current_step + 1) % total_steps
+				st.session_state.last_tick = now
+		current_idx = max(0, min(st.session_state.current_step, total_steps - 1))
+		current = steps[current_idx]
+		current_line = current.get("line", None)
+
+		# Enhanced Controls Section
 		st.markdown("""
-		<div class="card">
-			<h3 style="color: #8b5cf6; margin-bottom: 1rem; display: flex; align-items: center;">
-				📍 Code Execution
-				<span style="margin-left: auto; font-size: 0.9rem; color: #a78bfa;">
-					Line {current_line if current_line else 'N/A'}
-				</span>
-			</h3>
-		</div>
-		""", unsafe_allow_html=True)
-	
-	st.markdown(
-		build_highlighted_code_block(st.session_state.code, current_line, st.session_state.language),
-		unsafe_allow_html=True,
-	)
-
-	# Main Information Display in Cards
-	col1, col2 = st.columns([2, 1])
-	
-	with col1:
-		# Step Details Card
-		st.markdown(f"""
-		<div class="card">
-			<h3 style="color: #8b5cf6; margin-bottom: 1rem;">🔧 Step {current_idx + 1} Details</h3>
-			<div style="margin-bottom: 1rem;">
-				<strong style="color: #a855f7;">Operation:</strong> {current.get('operation', 'Unknown')}
-			</div>
-			<div style="margin-bottom: 1rem;">
-				<strong style="color: #a855f7;">Explanation:</strong><br>
-				<span style="color: #a78bfa;">{current.get('explanation', 'No explanation available')}</span>
-			</div>
-		</div>
+		<div class="progress-container">
 		""", unsafe_allow_html=True)
 		
-		# Variables Card
-		variables = current.get("variables", {})
-		if variables:
-			st.markdown("""
-			<div class="card">
-				<h3 style="color: #8b5cf6; margin-bottom: 1rem;">📊 Variables & Types</h3>
-			""", unsafe_allow_html=True)
-			
-			for var_name, var_value in variables.items():
-				if var_name.endswith('_type'):
-					continue
-				var_type = variables.get(f"{var_name}_type", "unknown")
-				st.markdown(f"""
-				<div class="variable-item">
-					<strong style="color: #a855f7;">{var_name}</strong>: 
-					<code style="background: rgba(147, 51, 234, 0.2); padding: 0.2rem 0.4rem; border-radius: 4px;">{var_value}</code>
-					<span style="color: #a78bfa; font-size: 0.9rem;">({var_type})</span>
-				</div>
-				""", unsafe_allow_html=True)
-			
-			st.markdown("</div>", unsafe_allow_html=True)
-	
-	with col2:
-		# Execution Context Card
-		st.markdown(f"""
-		<div class="card">
-			<h3 style="color: #8b5cf6; margin-bottom: 1rem;">📍 Execution Context</h3>
-			<div style="margin-bottom: 1rem;">
-				<strong style="color: #a855f7;">Context:</strong><br>
-				<span style="color: #a78bfa;">{current.get('execution_context', 'Main execution')}</span>
-			</div>
-		""", unsafe_allow_html=True)
+		# Progress bar with better styling
+		progress_value = (current_idx + 1) / total_steps
+		st.progress(progress_value, text=f"Step {current_idx + 1} of {total_steps}")
 		
-		if current.get('control_flow'):
-			st.markdown(f"""
-			<div style="margin-bottom: 1rem;">
-				<strong style="color: #a855f7;">Control Flow:</strong><br>
-				<span style="color: #a78bfa;">{current.get('control_flow', '')}</span>
-			</div>
-			""", unsafe_allow_html=True)
+		# Control buttons with modern styling. State changes happen in on_click callbacks,
+		# which run before the rerun the click triggers, so no extra st.rerun() is needed.
+		col1, col2, col3, col4, col5 = st.columns([1, 1, 1, 1, 1])
 		
-		if current.get('next_action'):
-			st.markdown(f"""
-			<div style="margin-bottom: 1rem;">
-				<strong style="color: #a855f7;">Next Action:</strong><br>
-				<span style="color: #a78bfa;">{current.get('next_action', '')}</span>
-			</div>
-			""", unsafe_allow_html=True)
+		with col1:
+			st.button("⏮️ First", use_container_width=True, help="Go to first step", on_click=go_to_step, args=(0,))
 		
-		st.markdown("</div>", unsafe_allow_html=True)
+		with col2:
+			st.button(
+				"◀️ Prev",
+				use_container_width=True,
+				help="Previous step",
+				on_click=go_to_step,
+				args=((current_idx - 1) % total_steps,),
+			)
 		
-		# Call Stack Card
-		call_stack = current.get("call_stack", [])
-		st.markdown("""
-		<div class="card">
-			<h3 style="color: #8b5cf6; margin-bottom: 1rem;">📞 Call Stack</h3>
-		""", unsafe_allow_html=True)
+		with col3:
+			# Show different button text based on current state
+			button_text = "⏸️ Pause" if st.session_state.playing else "▶️ Play"
+			button_type = "secondary" if st.session_state.playing else "primary"
+			st.button(
+				button_text,
+				type=button_type,
+				use_container_width=True,
+				help="Play/Pause auto-advance",
+				on_click=toggle_playing,
+			)
 		
-		if call_stack:
-			for i, func in enumerate(call_stack):
-				indent = "&nbsp;" * (i * 2)
-				st.markdown(f"""
-				<div style="margin: 0.5rem 0; color: #a78bfa;">
-					{indent}→ <strong style="color: #a855f7;">{func}</strong>
-				</div>
-				""", unsafe_allow_html=True)
-		else:
-			st.markdown("""
-			<div style="color: #a78bfa;">Main execution</div>
-			""", unsafe_allow_html=True)
+		with col4:
+			st.button(
+				"Next ▶️",
+				use_container_width=True,
+				help="Next step",
+				on_click=go_to_step,
+				args=((current_idx + 1) % total_steps,),
+			)
+		
+		with col5:
+			st.button(
+				"⏭️ Last", use_container_width=True, help="Go to last step", on_click=go_to_step, args=(total_steps - 1,)
+			)
+
+		# Reset button
+		st.button(
+			"🔄 Reset to Beginning", use_container_width=True, help="Reset to first step", on_click=go_to_step, args=(0,)
+		)
 		
 		st.markdown("</div>", unsafe_allow_html=True)
-	
-	# Additional Information in Expandable Sections
-	col3, col4 = st.columns([1, 1])
-	
-	with col3:
-		# Memory State
+		
+		# Status indicator
+		if st.session_state.playing:
+			st.markdown("""
+			<div style="background: rgba(147, 51, 234, 0.9); 
+			            backdrop-filter: blur(10px);
+			            color: white; padding: 0.75rem 1.5rem; border-radius: 20px; 
+			            margin: 1rem 0; text-align: center; font-weight: 600;
+			            box-shadow: 0 4px 15px rgba(147, 51, 234, 0.4);
+			            border: 1px solid rgba(255,255,255,0.2);
+			            animation: pulse 2s infinite;">
+				🎬 Auto-playing - Steps advance every 3 seconds
+			</div>
+			""", unsafe_allow_html=True)
+
+		# Code Execution Display
+		st.markdown(
+			CODE_EXECUTION_HEADER.format(line=current_line if current_line else "N/A"), unsafe_allow_html=True
+		)
+
+		st.markdown(
+			build_highlighted_code_block(st.session_state.code, current_line, st.session_state.language),
+			unsafe_allow_html=True,
+		)
+
+		# Main Information Display in Cards
+		col1, col2 = st.columns([2, 1])
+
+		# Static cards, rendered once per analysis; a step change only looks them up
+		step_html = st.session_state.step_html
+		panels = step_html[current_idx] if current_idx < len(step_html) else render_step_panels(current, current_idx)
+
+		with col1:
+			st.markdown(panels["main"], unsafe_allow_html=True)
+
+		with col2:
+			st.markdown(panels["side"], unsafe_allow_html=True)
+
+		# Additional Information in Expandable Sections. The expanders track their open
+		# state, so a collapsed panel skips building its content on every tick
 		memory_state = current.get("memory_state", {})
-		if memory_state:
-			with st.expander("💾 Memory State", expanded=False):
-				heap = memory_state.get("heap", {})
-				stack = memory_state.get("stack", [])
-				if heap:
-					st.markdown("**Heap:**")
-					for obj_id, details in heap.items():
-						st.write(f"  {obj_id}: {details}")
-				if stack:
-					st.markdown("**Stack:**")
-					st.write(f"  {', '.join(stack)}")
-	
-	with col4:
-		# Outputs
 		outputs = current.get("outputs", "")
+		# Only non-empty panels get a column; a step with neither emits no columns at all
+		panel_count = bool(memory_state) + bool(outputs)
+		panel_columns = iter(st.columns(panel_count) if panel_count else ())
+
+		if memory_state:
+			with next(panel_columns):
+				with st.expander("💾 Memory State", expanded=False, key="viz_memory", on_change="rerun") as panel:
+					if panel.open:
+						heap = memory_state.get("heap", {})
+						stack = memory_state.get("stack", [])
+						sections = []
+						if heap:
+							sections.append("**Heap:**")
+							sections.extend(f"{obj_id}: {details}" for obj_id, details in heap.items())
+						if stack:
+							sections.append("**Stack:**")
+							sections.append(', '.join(stack))
+						if sections:
+							st.markdown("\n\n".join(sections))
+
 		if outputs:
-			with st.expander("📤 Outputs", expanded=False):
-				st.code(outputs)
-	
-	# Data Structures Visualization
-	data_structures = current.get("data_structures", {})
-	if data_structures:
-		with st.expander("🏗️ Data Structures", expanded=False):
-			for ds_name, ds_info in data_structures.items():
-				st.markdown(f"""
-				<div class="card" style="margin-bottom: 1rem;">
-					<h4 style="color: #8b5cf6; margin-bottom: 1rem;">{ds_name}</h4>
-				""", unsafe_allow_html=True)
-				
-				if isinstance(ds_info, dict):
-					if "elements" in ds_info:
-						# List visualization
-						elements = ds_info.get("elements", [])
-						current_index = ds_info.get("index", 0)
-						length = ds_info.get("length", len(elements))
-						
-						if elements:
-							st.markdown(f"""
-							<div style="margin-bottom: 1rem;">
-								<strong style="color: #a855f7;">Length:</strong> {length} | 
-								<strong style="color: #a855f7;">Current Index:</strong> {current_index}
-							</div>
-							""", unsafe_allow_html=True)
-							
-							# Show elements with current index highlighted
-							st.markdown("**Elements:**")
-							for i, elem in enumerate(elements):
-								if i == current_index:
-									st.markdown(f"""
-									<div style="background: #fff3bf; padding: 0.5rem; border-radius: 4px; 
-									            border-left: 4px solid #ff6b6b; margin: 0.25rem 0;">
-										<strong>[{i}]: {elem}</strong> ← Current
-									</div>
-									""", unsafe_allow_html=True)
-								else:
-									st.markdown(f"""
-									<div style="background: #f8f9fa; padding: 0.5rem; border-radius: 4px; 
-									            margin: 0.25rem 0;">
-										[{i}]: {elem}
-									</div>
-									""", unsafe_allow_html=True)
+			with next(panel_columns):
+				with st.expander("📤 Outputs", expanded=False, key="viz_outputs", on_change="rerun") as panel:
+					if panel.open:
+						st.code(outputs)
+
+		# Data Structures Visualization
+		data_structures = current.get("data_structures", {})
+		if data_structures:
+			with st.expander("🏗️ Data Structures", expanded=False, key="viz_data_structures", on_change="rerun") as panel:
+				if panel.open:
+					for ds_name, ds_info in data_structures.items():
+						parts = [f'<div class="card" style="margin-bottom: 1rem;"><h4 style="color: #8b5cf6; margin-bottom: 1rem;">{escape_value(ds_name)}</h4>']
+
+						if isinstance(ds_info, dict) and "elements" in ds_info:
+							# List visualization
+							elements = ds_info.get("elements", [])
+							current_index = ds_info.get("index", 0)
+							length = ds_info.get("length", len(elements))
+
+							if elements:
+								parts.append(
+									f'<div style="margin-bottom: 1rem;"><strong style="color: #a855f7;">Length:</strong> {length} | '
+									f'<strong style="color: #a855f7;">Current Index:</strong> {current_index}</div>'
+								)
+								# Show elements with current index highlighted
+								parts.append("<strong>Elements:</strong>")
+								parts.extend(
+									f'<div class="ds-current"><strong>[{i}]: {escape_value(elem)}</strong> ← Current</div>'
+									if i == current_index
+									else f'<div class="ds-other">[{i}]: {escape_value(elem)}</div>'
+									for i, elem in enumerate(elements)
+								)
+							else:
+								parts.append("<div>Empty list</div>")
+
+						elif isinstance(ds_info, dict) and "keys" in ds_info and "values" in ds_info:
+							# Dictionary visualization
+							keys = ds_info.get("keys", [])
+							values = ds_info.get("values", [])
+							current_key = ds_info.get("current_key", "")
+
+							parts.append(
+								f'<div style="margin-bottom: 1rem;"><strong style="color: #a855f7;">Keys:</strong> {escape_value(keys)}<br>'
+								f'<strong style="color: #a855f7;">Values:</strong> {escape_value(values)}</div>'
+							)
+							if current_key:
+								parts.append(
+									'<div style="background: rgba(147, 51, 234, 0.2); padding: 0.5rem; border-radius: 4px; '
+									f'border-left: 4px solid #a855f7;"><strong style="color: #a855f7;">Current Key:</strong> {escape_value(current_key)}</div>'
+								)
+
 						else:
-							st.write("Empty list")
-					
-					elif "keys" in ds_info and "values" in ds_info:
-						# Dictionary visualization
-						keys = ds_info.get("keys", [])
-						values = ds_info.get("values", [])
-						current_key = ds_info.get("current_key", "")
-						
-						st.markdown(f"""
-						<div style="margin-bottom: 1rem;">
-							<strong style="color: #a855f7;">Keys:</strong> {keys}<br>
-							<strong style="color: #a855f7;">Values:</strong> {values}
-						</div>
-						""", unsafe_allow_html=True)
-						
-						if current_key:
-							st.markdown(f"""
-							<div style="background: rgba(147, 51, 234, 0.2); padding: 0.5rem; border-radius: 4px; 
-							            border-left: 4px solid #a855f7;">
-								<strong style="color: #a855f7;">Current Key:</strong> {current_key}
-							</div>
-							""", unsafe_allow_html=True)
-					
-					else:
-						# Generic structure
-						st.json(ds_info)
-				else:
-					st.write(ds_info)
-				
-				st.markdown("</div>", unsafe_allow_html=True)
-	
-	# Variable History (if available)
-	if current_idx > 0 and current.get("variables"):
-		with st.expander("📈 Variable Changes", expanded=False):
-			st.markdown("""
-			<div class="card">
-				<h4 style="color: #8b5cf6; margin-bottom: 1rem;">Variable Changes from Previous Step</h4>
-			""", unsafe_allow_html=True)
-			
-			current_vars = current.get("variables", {})
-			if len(steps) > current_idx:
-				prev_vars = steps[current_idx - 1].get("variables", {})
-				
-				changes_found = False
-				for var_name, var_value in current_vars.items():
-					if var_name.endswith('_type'):
-						continue
-					prev_value = prev_vars.get(var_name, "undefined")
-					if prev_value != var_value:
-						changes_found = True
-						st.markdown(f"""
-						<div style="background: rgba(147, 51, 234, 0.2); padding: 0.75rem; border-radius: 6px; 
-						            border-left: 4px solid #a855f7; margin: 0.5rem 0;">
-							<strong style="color: #8b5cf6;">{var_name}:</strong> 
-							<code style="background: rgba(147, 51, 234, 0.3); padding: 0.2rem 0.4rem; border-radius: 3px;">{prev_value}</code> 
-							→ 
-							<code style="background: rgba(147, 51, 234, 0.3); padding: 0.2rem 0.4rem; border-radius: 3px;">{var_value}</code>
-							<span style="color: #a855f7;">🔄 Changed</span>
-						</div>
-						""", unsafe_allow_html=True)
-					else:
-						st.markdown(f"""
-						<div style="background: rgba(147, 51, 234, 0.1); padding: 0.5rem; border-radius: 6px; 
-						            margin: 0.25rem 0; color: #a78bfa;">
-							<strong>{var_name}:</strong> {var_value} (unchanged)
-						</div>
-						""", unsafe_allow_html=True)
-				
-				if not changes_found:
-					st.markdown("""
-					<div style="text-align: center; color: #a78bfa; padding: 1rem;">
-						No variable changes in this step
-					</div>
-					""", unsafe_allow_html=True)
-			else:
-				for var_name, var_value in current_vars.items():
-					if not var_name.endswith('_type'):
-						st.markdown(f"""
-						<div style="background: rgba(147, 51, 234, 0.1); padding: 0.5rem; border-radius: 6px; 
-						            margin: 0.25rem 0;">
-							<strong style="color: #a855f7;">{var_name}:</strong> {var_value}
-						</div>
-						""", unsafe_allow_html=True)
-			
-			st.markdown("</div>", unsafe_allow_html=True)
-
-	# Auto-advance when playing - use a placeholder for smoother updates
-	auto_placeholder = st.empty()
-	
-	if st.session_state.playing and total_steps > 0:
-		with auto_placeholder.container():
-			st.info("🔄 Auto-playing... Click Play/Pause to stop")
+							# Generic structure: header only, the value is rendered by Streamlit below
+							parts.append("</div>")
+							st.markdown("".join(parts), unsafe_allow_html=True)
+							if isinstance(ds_info, dict):
+								st.json(ds_info)
+							else:
+								st.write(ds_info)
+							continue
+
+						parts.append("</div>")
+						st.markdown("\n".join(parts), unsafe_allow_html=True)
+
+		# Variable History (if available), diffed once per analysis
+		var_changes = st.session_state.var_changes
+		if current_idx > 0 and current.get("variables") and current_idx < len(var_changes):
+			with st.expander("📈 Variable Changes", expanded=False, key="viz_var_changes", on_change="rerun") as panel:
+				if panel.open:
+					parts = ['<div class="card"><h4 style="color: #8b5cf6; margin-bottom: 1rem;">Variable Changes from Previous Step</h4>']
+
+					changes_found = False
+					for var_name, prev_value, var_value, changed in var_changes[current_idx]:
+						if changed:
+							changes_found = True
+							parts.append(
+								f'<div class="var-changed"><strong style="color: #8b5cf6;">{escape_value(var_name)}:</strong> '
+								f'<code>{escape_value(prev_value)}</code> → <code>{escape_value(var_value)}</code> '
+								'<span style="color: #a855f7;">🔄 Changed</span></div>'
+							)
+						else:
+							parts.append(f'<div class="var-unchanged"><strong>{escape_value(var_name)}:</strong> {escape_value(var_value)} (unchanged)</div>')
+
+					if not changes_found:
+						parts.append('<div style="text-align: center; color: #a78bfa; padding: 1rem;">No variable changes in this step</div>')
+
+					parts.append("</div>")
+					st.markdown("\n".join(parts), unsafe_allow_html=True)
+
+		# Auto-advance happens at the top of the next scheduled fragment run
+		auto_placeholder = st.empty()
 		
-		# Check if enough time has passed for the next step
-		now = time.time()
-		if now - st.session_state.last_tick >= st.session_state.autoplay_interval:
-			# Move to next step
-			new_step = (current_idx + 1) % total_steps
-			st.session_state.current_step = new_step
-			st.session_state.last_tick = now
-			
-			# Force a rerun to update the display
-			st.rerun()
+		if st.session_state.playing and total_steps > 0:
+			with auto_placeholder.container():
+				st.info("🔄 Auto-playing... Click Play/Pause to stop")
 		else:
-			# If still playing but not time yet, schedule a rerun in a short time
-			time.sleep(0.1)
-			st.rerun()
-	else:
-		# Clear the auto-play message when paused
-		auto_placeholder.empty()
+			# Clear the auto-play message when paused
+			auto_placeholder.empty()
+
+
+# Only the visualization fragment reruns on autoplay ticks; the page above is left as is
+st.session_state._autoplay_timer = st.session_state.playing
+st.fragment(
+	render_visualization,
+	run_every=st.session_state.autoplay_interval if st.session_state.playing else None,
+)()
@@ -4,16 +4,15 @@ def visualize_primes(limit):
     """
     Find and return all prime numbers up to the given limit.
     """
-    primes = []
-    for num in range(2, limit + 1):
-        is_prime = True
-        for i in range(2, int(num ** 0.5) + 1):
-            if num % i == 0:
-                is_prime = False
-                break
-        if is_prime:
-            primes.append(num)
-    return primes
+    if limit < 2:
+        return []
+    # Sieve of Eratosthenes: strike out multiples of each prime with one slice assignment
+    is_prime = bytearray([1]) * (limit + 1)
+    is_prime[0] = is_prime[1] = 0
+    for i in range(2, int(limit ** 0.5) + 1):
+        if is_prime[i]:
+            is_prime[i * i :: i] = bytes(len(range(i * i, limit + 1, i)))
+    return [num for num, flag in enumerate(is_prime) if flag]
 
 # Test the function
 limit = 20
@@ -0,0 +1,201 @@
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+import streamlit as st
+
+_HTML_ESCAPE_TABLE = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&#39;"})
+_HTML_SPECIAL_CHARS = frozenset("&<>\"'")
+
+
+def get_code_rows(code_text: str) -> List[str]:
+    """Return the escaped, non-highlighted HTML row for every code line.
+
+    Rows are rebuilt only when the code changes; every other rerun (e.g. an
+    autoplay tick) reuses the copy kept in session state.
+    """
+    code_hash = hash(code_text)
+    if st.session_state.get("_code_rows_hash") != code_hash:
+        escaped_lines = [escape_html(line) for line in code_text.splitlines()]
+        st.session_state._escaped_lines = escaped_lines
+        st.session_state._code_rows = [
+            f"<div><span style='color:#999;margin-right:12px;'>{idx + 1:3d}</span><code>{line}</code></div>"
+            for idx, line in enumerate(escaped_lines)
+        ]
+        st.session_state._code_blocks = {}
+        st.session_state._code_rows_hash = code_hash
+    return st.session_state._code_rows
+
+
+def build_highlighted_code_block(code_text: str, current_line: Optional[int], language: str) -> str:
+    """Return HTML that renders code lines with the current line highlighted.
+
+    Uses <mark> for the active line index (1-based). Falls back gracefully if line
+    number is out of range. Shows context around the current line.
+    """
+    rows = get_code_rows(code_text)
+    # Steps revisit the same lines (loops), so each line's block is built once per code
+    blocks = st.session_state.setdefault("_code_blocks", {})
+    cached = blocks.get(current_line)
+    if cached is not None:
+        return cached
+
+    # Show context around current line (3 lines before and after)
+    start_idx = max(0, (current_line or 1) - 4)
+    end_idx = min(len(rows), (current_line or 1) + 3)
+
+    html_lines = rows[start_idx:end_idx]
+    # Only the active line differs, so patch it in the sliced window
+    if current_line is not None and start_idx < current_line <= end_idx:
+        escaped_line = st.session_state._escaped_lines[current_line - 1]
+        html_lines[current_line - 1 - start_idx] = (
+            f"<div style='background:#fff3bf;border-left:4px solid #ff6b6b;padding-left:8px;'><span style='color:#666;margin-right:12px;'>{current_line:3d}</span><code>{escaped_line}</code></div>"
+        )
+
+    # Wrap with a container mimicking code styling
+    html = (
+        "<div style=\"font-family:Menlo,Consolas,monospace;font-size:13px;"
+        "line-height:1.4;border:1px solid #ddd;border-radius:8px;"
+        "padding:16px;background:#f8f9fa;overflow-x:auto;box-shadow:0 2px 4px rgba(0,0,0,0.1);\">"
+        + "\n".join(html_lines)
+        + "</div>"
+    )
+    blocks[current_line] = html
+    return html
+
+
+def escape_html(text: str) -> str:
+    # Most lines and values contain nothing to escape; isdisjoint scans in C and
+    # returns the string as is instead of translating it into a copy
+    if _HTML_SPECIAL_CHARS.isdisjoint(text):
+        return text
+    # One C-level pass instead of five chained str.replace calls
+    return text.translate(_HTML_ESCAPE_TABLE)
+
+
+def escape_value(value: Any) -> str:
+    # Model output is shown inside HTML; a frame like "<module>" would otherwise vanish as a tag
+    return escape_html(str(value))
+
+
+@lru_cache(maxsize=32)
+def format_summary(summary_text: str) -> str:
+    """Format the summary text with better structure and readability
+
+    Pure in its argument, so every rerun of the same analysis reuses the HTML.
+    """
+    paragraphs = [p.strip() for p in summary_text.split('\n\n') if p.strip()]
+    
+    formatted_html = ""
+    for i, paragraph in enumerate(paragraphs):
+        # Check if paragraph starts with a number (like "1)", "2)", etc.)
+        if paragraph and paragraph[0].isdigit() and ')' in paragraph[:3]:
+            formatted_html += f"""
+            <div style="margin-bottom: 1.2rem; line-height: 1.7; padding: 1rem; 
+                        background: rgba(147, 51, 234, 0.1); border-left: 4px solid #8b5cf6; 
+                        border-radius: 8px;">
+                <strong style="color: #8b5cf6; font-size: 1.1rem;">{paragraph}</strong>
+            </div>
+            """
+        else:
+            formatted_html += f"""
+            <div style="margin-bottom: 1.2rem; line-height: 1.7; padding: 1rem; 
+                        background: rgba(147, 51, 234, 0.05); border-radius: 8px; 
+                        text-align: justify;">
+                {paragraph}
+            </div>
+            """
+    
+    return formatted_html
+
+
+def compute_variable_changes(steps: List[Dict[str, Any]]) -> List[List[Tuple[str, Any, Any, bool]]]:
+    """Return (name, previous value, value, changed) for every variable of every step.
+
+    Computed once per analysis; the Variable Changes panel only renders it.
+    Variables missing from the previous step have the previous value "undefined".
+    """
+    changes: List[List[Tuple[str, Any, Any, bool]]] = []
+    prev_vars: Dict[str, Any] = {}
+    for step in steps:
+        current_vars = step.get("variables", {}) or {}
+        step_changes = []
+        for var_name, var_value in current_vars.items():
+            if var_name.endswith('_type'):
+                continue
+            prev_value = prev_vars.get(var_name, "undefined")
+            step_changes.append((var_name, prev_value, var_value, prev_value != var_value))
+        changes.append(step_changes)
+        prev_vars = current_vars
+    return changes
+
+
+def render_step_panels(step: Dict[str, Any], index: int) -> Dict[str, str]:
+    """Return the HTML of the static cards of one step, one string per column.
+
+    "main" holds the details and variables cards, "side" the execution context and
+    call stack, so each column is a single markdown element. Fragments stay on one
+    line each; a blank or indented line would end the markdown HTML block.
+    """
+    details = (
+        f'<div class="card"><h3 style="color: #8b5cf6; margin-bottom: 1rem;">🔧 Step {index + 1} Details</h3>'
+        f'<div style="margin-bottom: 1rem;"><strong style="color: #a855f7;">Operation:</strong> {escape_value(step.get("operation", "Unknown"))}</div>'
+        '<div style="margin-bottom: 1rem;"><strong style="color: #a855f7;">Explanation:</strong><br>'
+        f'<span style="color: #a78bfa;">{escape_value(step.get("explanation", "No explanation available"))}</span></div></div>'
+    )
+
+    variables = step.get("variables", {})
+    variables_html = ""
+    if variables:
+        parts = ['<div class="card"><h3 style="color: #8b5cf6; margin-bottom: 1rem;">📊 Variables & Types</h3>']
+        for var_name, var_value in variables.items():
+            if var_name.endswith('_type'):
+                continue
+            var_type = variables.get(f"{var_name}_type", "unknown")
+            parts.append(
+                f'<div class="variable-item"><strong style="color: #a855f7;">{escape_value(var_name)}</strong>: '
+                f'<code style="background: rgba(147, 51, 234, 0.2); padding: 0.2rem 0.4rem; border-radius: 4px;">{escape_value(var_value)}</code> '
+                f'<span style="color: #a78bfa; font-size: 0.9rem;">({escape_value(var_type)})</span></div>'
+            )
+        parts.append("</div>")
+        variables_html = "\n".join(parts)
+
+    parts = [
+        '<div class="card"><h3 style="color: #8b5cf6; margin-bottom: 1rem;">📍 Execution Context</h3>'
+        '<div style="margin-bottom: 1rem;"><strong style="color: #a855f7;">Context:</strong><br>'
+        f'<span style="color: #a78bfa;">{escape_value(step.get("execution_context", "Main execution"))}</span></div>'
+    ]
+    if step.get('control_flow'):
+        parts.append(
+            '<div style="margin-bottom: 1rem;"><strong style="color: #a855f7;">Control Flow:</strong><br>'
+            f'<span style="color: #a78bfa;">{escape_value(step.get("control_flow", ""))}</span></div>'
+        )
+    if step.get('next_action'):
+        parts.append(
+            '<div style="margin-bottom: 1rem;"><strong style="color: #a855f7;">Next Action:</strong><br>'
+            f'<span style="color: #a78bfa;">{escape_value(step.get("next_action", ""))}</span></div>'
+        )
+    parts.append("</div>")
+    context_html = "\n".join(parts)
+
+    call_stack = step.get("call_stack", [])
+    parts = ['<div class="card"><h3 style="color: #8b5cf6; margin-bottom: 1rem;">📞 Call Stack</h3>']
+    if call_stack:
+        for i, func in enumerate(call_stack):
+            indent = "&nbsp;" * (i * 2)
+            parts.append(
+                f'<div style="margin: 0.5rem 0; color: #a78bfa;">{indent}→ <strong style="color: #a855f7;">{escape_value(func)}</strong></div>'
+            )
+    else:
+        parts.append('<div style="color: #a78bfa;">Main execution</div>')
+    parts.append("</div>")
+    stack_html = "\n".join(parts)
+
+    return {
+        "main": "\n".join(filter(None, (details, variables_html))),
+        "side": "\n".join((context_html, stack_html)),
+    }
+
+
+def build_step_html(steps: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    """Render the static cards of every step once per analysis; see render_step_panels."""
+    return [render_step_panels(step, i) for i, step in enumerate(steps)]